@@ -0,0 +1,555 @@
+"""
+Stand-in Zendesk server for benchmarking zenkly without a live instance.
+
+Serves generated macros, triggers, automations, views, brands and Help
+Center content (with cursor and offset pagination), accepts macro writes
+and theme uploads, and can add latency, enforce a rate limit and inject
+errors. Records are generated from their id on every request, so lists of
+any size cost no memory. Point a zenkly profile at it with the `base_url`
+setting, e.g.
+
+    python benchmarks/mock_zendesk.py --port 8765 --records 10000 --latency 0.05
+
+and `base_url = http://127.0.0.1:8765` in config.ini.
+"""
+import re
+import json
+import time
+import random
+import hashlib
+import itertools
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import click
+
+RULE_KINDS = ('macros', 'triggers', 'automations', 'views')
+GUIDE_TYPES = ('articles', 'sections', 'categories')
+MAX_PAGE_SIZE = 100
+# Zendesk rejects offset pages past this one, so longer lists need cursor pagination.
+MAX_OFFSET_PAGES = 100
+# The budget reported without --rate-limit. Zendesk always reports one, and clients go slow until it does.
+UNLIMITED_RATE_LIMIT = 1000000
+SECTIONS_PER_CATEGORY = 10
+ARTICLES_PER_SECTION = 20
+# Every item was last updated at this time, except the ones that keep changing (see --change-rate).
+BASE_UPDATED_AT = '2024-01-01T00:00:00Z'
+ERROR_STATUSES = (502, 503, 504)
+
+LIST_PATH = re.compile(r'^/api/v2/(?:help_center/)?(?P<kind>\w+)\.json$')
+TRANSLATIONS_PATH = re.compile(r'^/api/v2/help_center/(?P<kind>\w+)/(?P<id>\d+)/translations\.json$')
+MACRO_PATH = re.compile(r'^/api/v2/macros/(?P<id>\d+)\.json$')
+JOB_STATUS_PATH = re.compile(r'^/api/v2/job_statuses/(?P<id>[\w-]+)\.json$')
+THEME_JOB_PATH = re.compile(r'^/api/v2/guide/theming/jobs/(?P<id>[\w-]+)$')
+THEME_UPLOAD_PATH = re.compile(r'^/theme_uploads/(?P<id>[\w-]+)$')
+THEMES_PATH = re.compile(r'^/api/guide/theming/(?P<brand>\d+)/themes\.json$')
+PUBLISH_PATH = re.compile(r'^/api/guide/theming/(?P<brand>\d+)/themes/(?P<id>[\w-]+)/publish\.json$')
+
+FIELDS = ('status', 'priority', 'group_id', 'assignee_id', 'type', 'via_id', 'organization_id')
+OPERATORS = ('is', 'is_not', 'less_than', 'greater_than', 'includes')
+WORDS = ('refund', 'order', 'shipping', 'account', 'password', 'invoice', 'delivery', 'return', 'gift', 'card',
+         'billing', 'subscription', 'warranty', 'exchange', 'login', 'payment', 'discount', 'tracking')
+GERMAN_WORDS = dict(zip(WORDS, ('erstattung', 'bestellung', 'versand', 'konto', 'passwort', 'rechnung', 'lieferung',
+                                'rückgabe', 'geschenk', 'karte', 'abrechnung', 'abonnement', 'garantie', 'umtausch',
+                                'anmeldung', 'zahlung', 'rabatt', 'sendungsverfolgung')))
+# Every how many help center items one is also translated to German.
+TRANSLATED_EVERY = 3
+
+
+class MockZendesk:
+    """
+    The state and generated content of the stand-in server.
+    """
+
+    def __init__(self, records, guide_records, brands, latency, rate_limit, error_rate, drop_rate, change_rate,
+                 body_size, job_delay, seed, fail_page):
+        self.records = records
+        self.guide_records = guide_records
+        self.brands = brands
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.change_rate = change_rate
+        self.body_size = body_size
+        self.job_delay = job_delay
+        self.seed = seed
+        self.fail_page = fail_page
+        self.lock = threading.Lock()
+        self.tokens = rate_limit
+        self.refilled = time.monotonic()
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+        self.macro_ids = itertools.count(records + 1)
+        self.requests = 0
+
+    def count(self, kind):
+        if kind == 'categories':
+            return max(1, self.guide_records // (SECTIONS_PER_CATEGORY * ARTICLES_PER_SECTION))
+
+        if kind == 'sections':
+            return max(1, self.guide_records // ARTICLES_PER_SECTION)
+
+        return self.guide_records if kind == 'articles' else self.records
+
+    def is_changed(self, item_id):
+        return self.change_rate > 0 and item_id % round(1 / self.change_rate) == 0
+
+    def take_token(self):
+        """
+        :return: seconds until a request is allowed, 0 if it is allowed now
+        """
+        if not self.rate_limit:
+            return 0
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate_limit, self.tokens + (now - self.refilled) * self.rate_limit / 60)
+            self.refilled = now
+
+            if self.tokens < 1:
+                return (1 - self.tokens) * 60 / self.rate_limit
+
+            self.tokens -= 1
+
+            return 0
+
+    def make_rule(self, kind, item_id):
+        rng = random.Random(f"{self.seed}:{kind}:{item_id}")
+        rule = {
+            'url': f"/api/v2/{kind}/{item_id}.json",
+            'id': item_id,
+            'title': f"{rng.choice(WORDS).title()}::{rng.choice(WORDS).title()} {kind[:-1]} {item_id}",
+            'active': rng.random() > 0.2,
+            'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 12))) or None,
+            'position': item_id,
+            'created_at': BASE_UPDATED_AT,
+            'updated_at': BASE_UPDATED_AT,
+        }
+
+        actions = [{'field': rng.choice(FIELDS[:4] + (f"custom_fields_{rng.randint(1, 200)}",)),
+                    'value': str(rng.randint(1, 50))} for _ in range(rng.randint(1, 5))]
+        actions.append({'field': 'set_tags', 'value': ' '.join(rng.sample(WORDS, 2))})
+
+        if kind == 'triggers':
+            actions.append({'field': 'notification_user',
+                            'value': ['requester_id', 'Re: {{ticket.title}}', 'Body of trigger %d' % item_id]})
+
+        conditions = {
+            'all': [{'field': rng.choice(FIELDS + (f"custom_fields_{rng.randint(1, 200)}",)),
+                     'operator': rng.choice(OPERATORS), 'value': str(rng.randint(1, 50))}
+                    for _ in range(rng.randint(1, 4))],
+            'any': [{'field': 'current_tags', 'operator': 'includes', 'value': ' '.join(rng.sample(WORDS, 2))}
+                    for _ in range(rng.randint(0, 2))],
+        }
+
+        if kind == 'macros':
+            rule.update(actions=actions, restriction=None, usage_7d=rng.randint(0, 500))
+        elif kind == 'views':
+            rule.update(conditions=conditions, restriction=None, execution={
+                'group_by': 'status', 'sort_by': 'updated_at',
+                'columns': [{'id': 'subject', 'title': 'Subject'}, {'id': rng.randint(1, 200), 'title': 'Field'}],
+            })
+        else:
+            rule.update(actions=actions, conditions=conditions, raw_title=rule['title'],
+                        category_id=str(rng.randint(1, 10)))
+
+        return rule
+
+    def make_guide_item(self, kind, item_id, subdomain):
+        rng = random.Random(f"{self.seed}:{kind}:{item_id}")
+        title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).capitalize()
+        changed = self.is_changed(item_id)
+        updated_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()) if changed else BASE_UPDATED_AT
+        item = {
+            'id': item_id,
+            'url': f"https://{subdomain}.zendesk.com/api/v2/help_center/{kind}/{item_id}.json",
+            'html_url': f"https://{subdomain}.zendesk.com/hc/en-us/{kind}/{item_id}",
+            'locale': 'en-us',
+            'source_locale': 'en-us',
+            'position': item_id,
+            'created_at': BASE_UPDATED_AT,
+            'updated_at': updated_at,
+        }
+
+        if kind == 'articles':
+            words = ' '.join(rng.choice(WORDS) for _ in range(max(1, self.body_size // 8)))
+            item.update(title=title, body=f"<p>{words[:self.body_size]}</p>", draft=False, promoted=False,
+                        section_id=(item_id - 1) // ARTICLES_PER_SECTION + 1, author_id=rng.randint(1, 50),
+                        label_names=rng.sample(WORDS, rng.randint(0, 3)))
+        elif kind == 'sections':
+            item.update(name=title, description='', category_id=(item_id - 1) // SECTIONS_PER_CATEGORY + 1)
+        else:
+            item.update(name=title, description='')
+
+        return item
+
+    def make_translations(self, kind, item):
+        title = item.get('title') or item.get('name')
+        translations = [{'id': item['id'] * 10, 'locale': 'en-us', 'source_id': item['id'],
+                         'source_type': kind[:-1], 'title': title, 'body': item.get('body', ''), 'draft': False,
+                         'html_url': item['html_url'], 'updated_at': item['updated_at']}]
+
+        if item['id'] % TRANSLATED_EVERY == 0:
+            german = ' '.join(GERMAN_WORDS.get(word, word) for word in title.lower().split()).capitalize()
+            translations.append({**translations[0], 'id': item['id'] * 10 + 1, 'locale': 'de', 'title': german,
+                                 'body': f"<p>{german}</p>", 'html_url': item['html_url'].replace('/en-us/', '/de/')})
+
+        return translations
+
+    def make_brand(self, index, subdomain):
+        brand_subdomain = subdomain if index == 1 else f"{subdomain}-{index}"
+
+        return {'id': index, 'name': f"Brand {index}", 'subdomain': brand_subdomain, 'active': True,
+                'brand_url': f"https://{brand_subdomain}.zendesk.com", 'has_help_center': True,
+                'help_center_state': 'enabled', 'host_mapping': None, 'default': index == 1}
+
+    def get_ids(self, kind, query):
+        ids = range(1, self.count(kind) + 1)
+
+        if query.get('sort_by') == ['updated_at'] and query.get('sort_order') == ['desc']:
+            # Changed items first, so a listing of changes can stop at the first unchanged item.
+            return [i for i in ids if self.is_changed(i)] + [i for i in ids if not self.is_changed(i)]
+
+        return ids
+
+    def make_item(self, kind, item_id, subdomain, query):
+        if kind in RULE_KINDS:
+            return self.make_rule(kind, item_id)
+
+        if kind == 'brands':
+            return self.make_brand(item_id, subdomain)
+
+        item = self.make_guide_item(kind, item_id, subdomain)
+
+        if query.get('include') == ['translations']:
+            item['translations'] = self.make_translations(kind, item)
+
+        return item
+
+    def list_page(self, kind, path, query, subdomain):
+        """
+        Answer one page of a list, with cursor pagination when `page[size]`
+        is given and offset pagination (up to MAX_OFFSET_PAGES pages)
+        otherwise, like Zendesk. Pages from
+        `fail_page` on are answered with a 502.
+        """
+        ids = range(1, self.brands + 1) if kind == 'brands' else self.get_ids(kind, query)
+        base_url = f"https://{subdomain}.zendesk.com{path}"
+        extra = ''.join(f"&{key}={values[0]}" for key, values in query.items()
+                        if key not in ('page', 'per_page', 'page[size]', 'page[after]'))
+
+        if 'page[size]' in query:
+            size = min(MAX_PAGE_SIZE, int(query['page[size]'][0]))
+            start = int(query.get('page[after]', ['0'])[0])
+
+            if self.fail_page and start // size + 1 >= self.fail_page:
+                return {'error': 'BadGateway'}, 502
+
+            page_ids = ids[start:start + size]
+            has_more = start + size < len(ids)
+
+            return {
+                kind: [self.make_item(kind, i, subdomain, query) for i in page_ids],
+                'meta': {'has_more': has_more, 'after_cursor': str(start + size) if has_more else None},
+                'links': {'next': f"{base_url}?page[size]={size}&page[after]={start + size}{extra}"
+                          if has_more else None},
+            }
+
+        size = min(MAX_PAGE_SIZE, int(query.get('per_page', [MAX_PAGE_SIZE])[0]))
+        page = int(query.get('page', ['1'])[0])
+
+        if self.fail_page and page >= self.fail_page:
+            return {'error': 'BadGateway'}, 502
+
+        if page > MAX_OFFSET_PAGES:
+            return {'error': 'InvalidPaginationParameter',
+                    'description': f"Offset pagination is limited to the first {MAX_OFFSET_PAGES} pages. "
+                                   'Use cursor pagination instead.'}, 400
+
+        page_ids = ids[(page - 1) * size:page * size]
+
+        return {
+            kind: [self.make_item(kind, i, subdomain, query) for i in page_ids],
+            'count': len(ids),
+            'next_page': f"{base_url}?page={page + 1}&per_page={size}{extra}" if page * size < len(ids) else None,
+            'previous_page': None,
+        }
+
+    def incremental_articles(self, subdomain, query):
+        articles = [self.make_guide_item('articles', i, subdomain) for i in range(1, self.guide_records + 1)
+                    if self.is_changed(i)]
+
+        return {'articles': articles, 'count': len(articles), 'next_page': None, 'end_time': int(time.time())}
+
+    def create_job(self, **job):
+        job_id = f"job-{next(self.job_ids)}"
+
+        with self.lock:
+            self.jobs[job_id] = {'id': job_id, 'created': time.monotonic(), **job}
+
+        return job_id
+
+    def get_job_status(self, job_id):
+        job = self.jobs.get(job_id)
+
+        if job is None:
+            return None
+
+        done = time.monotonic() - job['created'] >= self.job_delay
+
+        return {'id': job_id, 'status': 'completed' if done else 'working',
+                'results': job.get('results') if done else None}
+
+
+class MockZendeskHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockZendesk'
+
+    @property
+    def mock(self):
+        return self.server.mock
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, body, status=200, headers=None):
+        content = json.dumps(body).encode('utf-8')
+        etag = f"\"{hashlib.md5(content).hexdigest()}\""
+
+        if status == 200 and self.command == 'GET' and self.headers.get('If-None-Match') == etag:
+            status, content = 304, b''
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+
+        if status in (200, 304):
+            self.send_header('ETag', etag)
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.send_rate_limit_headers()
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_rate_limit_headers(self):
+        if self.mock.rate_limit:
+            self.send_header('X-Rate-Limit', str(self.mock.rate_limit))
+            self.send_header('X-Rate-Limit-Remaining', str(int(self.mock.tokens)))
+        else:
+            self.send_header('X-Rate-Limit', str(UNLIMITED_RATE_LIMIT))
+            self.send_header('X-Rate-Limit-Remaining', str(UNLIMITED_RATE_LIMIT))
+
+    def send_empty(self, status, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.send_rate_limit_headers()
+        self.end_headers()
+
+    def read_body(self):
+        content = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(content or b'{}')
+
+        return content
+
+    def handle_request(self, route):
+        with self.mock.lock:
+            self.mock.requests += 1
+
+        if self.mock.latency:
+            time.sleep(self.mock.latency)
+
+        body = self.read_body()
+        wait = self.mock.take_token()
+
+        if wait:
+            return self.send_empty(429, {'Retry-After': str(max(1, round(wait)))})
+
+        roll = random.random()
+
+        if roll < self.mock.drop_rate:
+            self.close_connection = True
+            return
+
+        if roll < self.mock.drop_rate + self.mock.error_rate:
+            return self.send_empty(random.choice(ERROR_STATUSES))
+
+        url = urlsplit(self.path)
+        host = self.headers.get('Host', 'mock.zendesk.com')
+        subdomain = host.split('.')[0] if host.endswith('.zendesk.com') else 'mock'
+        result = route(url.path, parse_qs(url.query), subdomain, body)
+
+        if result is None:
+            return self.send_json({'error': 'InvalidEndpoint', 'description': 'Not found'}, 404)
+
+        if isinstance(result, tuple):
+            self.send_json(*result)
+        else:
+            self.send_json(result)
+
+    def do_GET(self):
+        self.handle_request(self.route_get)
+
+    def do_POST(self):
+        self.handle_request(self.route_post)
+
+    def do_PUT(self):
+        self.handle_request(self.route_put)
+
+    def route_get(self, path, query, subdomain, body):
+        mock = self.mock
+
+        if path == '/api/v2/help_center/incremental/articles.json':
+            return mock.incremental_articles(subdomain, query)
+
+        if path == '/api/v2/locales.json':
+            return {'locales': [{'id': 1, 'locale': 'en-US', 'name': 'English'}], 'count': 1, 'next_page': None}
+
+        match = TRANSLATIONS_PATH.match(path)
+
+        if match:
+            item = mock.make_guide_item(match['kind'], int(match['id']), subdomain)
+
+            return {'translations': mock.make_translations(match['kind'], item), 'meta': {'has_more': False},
+                    'links': {'next': None}}
+
+        match = JOB_STATUS_PATH.match(path)
+
+        if match:
+            status = mock.get_job_status(match['id'])
+
+            return {'job_status': status} if status else None
+
+        match = THEME_JOB_PATH.match(path)
+
+        if match:
+            status = mock.get_job_status(match['id'])
+
+            if status is None:
+                return None
+
+            uploaded = mock.jobs[match['id']].get('uploaded')
+            status['status'] = 'completed' if uploaded and status['status'] == 'completed' else 'pending'
+
+            return {'job': {'id': match['id'], 'status': status['status'], 'errors': []}}
+
+        match = THEMES_PATH.match(path)
+
+        if match:
+            return {'themes': [{'id': job_id, 'brand_id': int(match['brand']), 'live': False}
+                               for job_id, job in mock.jobs.items() if job.get('uploaded')]}
+
+        match = LIST_PATH.match(path)
+
+        if match and (match['kind'] in RULE_KINDS + GUIDE_TYPES or match['kind'] == 'brands'):
+            return mock.list_page(match['kind'], path, query, subdomain)
+
+        return None
+
+    def route_post(self, path, query, subdomain, body):
+        mock = self.mock
+
+        if path == '/api/v2/macros.json':
+            return {'macro': {**body['macro'], 'id': next(mock.macro_ids)}}, 201
+
+        if path == '/api/v2/guide/theming/jobs/themes/imports':
+            job_id = mock.create_job()
+
+            return {'job': {'id': job_id, 'status': 'pending', 'data': {'upload': {
+                'url': f"https://{subdomain}.zendesk.com/theme_uploads/{job_id}",
+                'parameters': {'key': f"themes/{job_id}.zip", 'policy': 'mock'},
+            }}}}, 202
+
+        match = THEME_UPLOAD_PATH.match(path)
+
+        if match and match['id'] in mock.jobs:
+            mock.jobs[match['id']].update(uploaded=len(body), created=time.monotonic())
+
+            return {}, 201
+
+        match = PUBLISH_PATH.match(path)
+
+        if match:
+            return {'theme': {'id': match['id'], 'brand_id': int(match['brand']), 'live': True}}
+
+        return None
+
+    def route_put(self, path, query, subdomain, body):
+        mock = self.mock
+
+        if path == '/api/v2/macros/update_many.json':
+            results = [{'id': macro['id'], 'action': 'update', 'success': True, 'status': 'Updated'}
+                       for macro in body['macros']]
+
+            return {'job_status': {'id': mock.create_job(results=results), 'status': 'queued'}}
+
+        match = MACRO_PATH.match(path)
+
+        if match:
+            return {'macro': {**mock.make_rule('macros', int(match['id'])), **body['macro']}}
+
+        return None
+
+
+def create_server(port=0, **options):
+    """
+    Create a stand-in server. Call `serve_forever()` on it to start answering.
+    :param port: the port to listen on, 0 for any free port
+    :param options: MockZendesk options
+    :return: the server, with the port it listens on in `server_address`
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockZendeskHandler)
+    server.daemon_threads = True
+    server.mock = MockZendesk(**options)
+
+    return server
+
+
+@click.command()
+@click.option('--port', type=click.INT, default=8765, show_default=True)
+@click.option('--records', type=click.IntRange(min=0), default=1000, show_default=True,
+              help='Number of macros, triggers, automations and views each.')
+@click.option('--guide-records', type=click.IntRange(min=0), default=1000, show_default=True,
+              help='Number of articles per help center (with one section per 20 and one category per 200).')
+@click.option('--brands', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of brands, each with its own help center.')
+@click.option('--latency', type=click.FloatRange(min=0), default=0, show_default=True,
+              help='Seconds added to every response.')
+@click.option('--rate-limit', type=click.IntRange(min=0), default=0, show_default=True,
+              help='Requests per minute allowed before answering 429, 0 for no limit.')
+@click.option('--error-rate', type=click.FloatRange(0, 1), default=0, show_default=True,
+              help='Share of requests answered with a 502, 503 or 504.')
+@click.option('--drop-rate', type=click.FloatRange(0, 1), default=0, show_default=True,
+              help='Share of requests whose connection is closed without an answer.')
+@click.option('--change-rate', type=click.FloatRange(0, 1), default=0.01, show_default=True,
+              help='Share of Help Center items that are always newly updated, for incremental backups.')
+@click.option('--body-size', type=click.IntRange(min=1), default=2000, show_default=True,
+              help='Size of article bodies in characters.')
+@click.option('--job-delay', type=click.FloatRange(min=0), default=0.5, show_default=True,
+              help='Seconds before a macro or theme job completes.')
+@click.option('--fail-page', type=click.IntRange(min=0), default=0, show_default=True,
+              help='Answer list pages from this one on with a 502, 0 to never fail.')
+@click.option('--seed', type=click.INT, default=0, show_default=True, help='Seed of the generated content.')
+def main(port, **options):
+    """Run a stand-in Zendesk server for benchmarks."""
+    server = create_server(port, **options)
+    click.echo(f"Mock Zendesk listening on http://127.0.0.1:{server.server_address[1]}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
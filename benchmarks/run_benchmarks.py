@@ -0,0 +1,674 @@
+"""
+End-to-end benchmarks of the zenkly CLI against the stand-in server in
+mock_zendesk.py, plus microbenchmarks of the CPU-bound parts (flattening
+and exports) and of startup time.
+
+Every scenario runs the real CLI in a subprocess with a throwaway config
+pointing at the server, and records its wall and CPU time, throughput,
+request latencies (from `--trace-file`), peak RSS and output size. The
+results are written to a JSON file, which a later run can be compared
+with:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+"""
+import io
+import os
+import csv
+import gzip
+import sys
+import json
+import time
+import shutil
+import zipfile
+import platform
+import tempfile
+import subprocess
+from collections import namedtuple
+from datetime import datetime, timezone
+from unittest import mock
+import click
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from mock_zendesk import MockZendesk, RULE_KINDS, SECTIONS_PER_CATEGORY, ARTICLES_PER_SECTION  # noqa: E402
+from zenkly.scripts.constants import APP_NAME  # noqa: E402
+
+# Runs the CLI, then writes its peak RSS in kilobytes to the file named by ZENKLY_BENCHMARK_RSS. Linux carries
+# ru_maxrss over fork and exec, so the child reads VmHWM, which starts afresh in the new process, where it can.
+CLI = '''
+import atexit, os, resource
+
+def write_peak_rss():
+    peak = None
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            peak = next((int(line.split()[1]) for line in f if line.startswith('VmHWM:')), None)
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if os.uname().sysname == 'Darwin' else 1)
+    with open(os.environ['ZENKLY_BENCHMARK_RSS'], 'w') as f:
+        f.write(str(peak))
+
+atexit.register(write_peak_rss)
+from zenkly.scripts.zenkly import cli
+cli(prog_name='zenkly')
+'''
+# Compared metrics, and whether a higher value is better.
+COMPARED_METRICS = {'wall_s': False, 'records_per_s': True, 'p95_ms': False, 'peak_rss_mb': False, 'read_s': False}
+
+# Loads of a scenario's output per run, of which the fastest is kept, so the first doesn't count imports.
+READ_REPEAT = 3
+
+Scenario = namedtuple('Scenario', ['name', 'args', 'records', 'setup', 'prepare', 'input', 'requires', 'read'])
+
+
+def scenario(name, args, records, setup=None, prepare=None, input=None, requires=None, read=None):
+    """
+    :param name: the scenario name
+    :param args: CLI arguments, where {work} is replaced by the scenario's working directory
+    :param records: function of the server options returning the number of records the scenario handles
+    :param setup: function of (working directory, server options) preparing input files
+    :param prepare: CLI arguments of a run that prepares the timed one, e.g. a full backup before an incremental one
+    :param input: text to answer prompts with
+    :param requires: module the scenario needs, skipped if it is not installed
+    :param read: (filename, function of the path) loading the scenario's output, timed after every run
+    """
+    return Scenario(name, args, records, setup, prepare, input, requires, read)
+
+
+def load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_ndjson(path):
+    with (gzip.open(path, 'rt') if path.endswith('.gz') else open(path)) as f:
+        return [json.loads(line) for line in f]
+
+
+def load_csv(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def load_parquet(path):
+    import pyarrow.parquet
+
+    return pyarrow.parquet.read_table(path)
+
+
+def count_guide_items(options):
+    articles = options['guide_records']
+    sections = max(1, articles // ARTICLES_PER_SECTION)
+    categories = max(1, articles // (SECTIONS_PER_CATEGORY * ARTICLES_PER_SECTION))
+
+    return (articles + sections + categories) * options['brands']
+
+
+def count_changed_guide_items(options):
+    return max(1, round(count_guide_items(options) * options['change_rate']))
+
+
+def write_macros(work, options, only_active=False):
+    content = MockZendesk(**options)
+    macros = [content.make_rule('macros', i) for i in range(1, options['records'] + 1)]
+
+    if only_active:
+        # Macros that only toggle `active` can be sent with update_many.
+        macros = [{'id': m['id'], 'active': not m['active']} for m in macros]
+
+    with open(os.path.join(work, 'macros.json'), 'w') as f:
+        json.dump({'macros': macros}, f)
+
+
+def write_article_backups(work, options):
+    content = MockZendesk(**options)
+    old = [content.make_guide_item('articles', i, 'bench') for i in range(1, options['guide_records'] + 1)]
+    # The new help center has the same articles under new ids, a tenth of them retitled slightly.
+    new = [{**a, 'id': a['id'] + 10 ** 9, 'title': a['title'] + ' (updated)' if a['id'] % 10 == 0 else a['title']}
+           for a in old]
+
+    for name, articles in (('old.json', old), ('new.json', new)):
+        with open(os.path.join(work, name), 'w') as f:
+            json.dump(articles, f)
+
+
+def write_theme(work, options):
+    with zipfile.ZipFile(os.path.join(work, 'theme.zip'), 'w') as theme:
+        theme.writestr('manifest.json', json.dumps({'name': 'Benchmark', 'version': '1.0.0'}))
+        theme.writestr('templates/home_page.hbs', '<h1>{{help_center.name}}</h1>\n' * 1000)
+
+
+SCENARIOS = [
+    scenario('get-macros', ['get-macros', '--directory', '{work}'], lambda o: o['records']),
+    # The same triggers in every format, each loaded back after the export, to weigh size against read time.
+    scenario('get-triggers-json', ['get-triggers', '--directory', '{work}'], lambda o: o['records'],
+             read=('triggers.json', load_json)),
+    scenario('get-triggers-ndjson', ['get-triggers', '--directory', '{work}', '--format', 'ndjson'],
+             lambda o: o['records'], read=('triggers.ndjson', load_ndjson)),
+    scenario('get-triggers-ndjson-gzip',
+             ['get-triggers', '--directory', '{work}', '--format', 'ndjson', '--compress', 'gzip'],
+             lambda o: o['records'], read=('triggers.ndjson.gz', load_ndjson)),
+    scenario('get-triggers-csv', ['get-triggers', '--directory', '{work}', '--format', 'csv'],
+             lambda o: o['records'], read=('triggers.csv', load_csv)),
+    scenario('get-triggers-parquet', ['get-triggers', '--directory', '{work}', '--format', 'parquet'],
+             lambda o: o['records'], requires='pyarrow', read=('triggers.parquet', load_parquet)),
+    # The same command and data on both engines, at the same concurrency, so only the engine differs.
+    scenario('get-views-sync', ['--engine', 'sync', '--concurrency', '8', 'get-views', '--directory', '{work}'],
+             lambda o: o['records']),
+    scenario('get-views-async', ['--engine', 'async', '--concurrency', '8', 'get-views', '--directory', '{work}'],
+             lambda o: o['records'], requires='aiohttp'),
+    scenario('rule-references', ['rule-references', 'group_id=7'], lambda o: o['records'] * len(RULE_KINDS)),
+    scenario('backup-guide', ['backup-guide', '--directory', '{work}', '--all-brands'], count_guide_items),
+    scenario('backup-guide-store', ['backup-guide', '--directory', '{work}', '--all-brands', '--store'],
+             count_guide_items),
+    scenario('backup-guide-incremental', ['backup-guide', '--directory', '{work}', '--all-brands', '--incremental'],
+             count_changed_guide_items, prepare=['backup-guide', '--directory', '{work}', '--all-brands']),
+    scenario('add-macros', ['--concurrency', '8', 'add-macros', '--directory', '{work}', '--filename', 'macros.json'],
+             lambda o: o['records'], setup=write_macros, input='y\n'),
+    scenario('update-macros-bulk',
+             ['--concurrency', '8', 'update-macros', '--directory', '{work}', '--filename', 'macros.json', '--bulk'],
+             lambda o: o['records'], setup=lambda work, o: write_macros(work, o, only_active=True), input='y\n'),
+    scenario('create-article-mapping',
+             ['create-article-mapping', '--old-backup-file', '{work}/old.json', '--new-backup-file',
+              '{work}/new.json', '--directory', '{work}', '--fuzzy'],
+             lambda o: o['guide_records'], setup=write_article_backups),
+    scenario('upload-theme', ['upload-theme', '--brand-id', '1', '--file', '{work}/theme.zip'], lambda o: 1,
+             setup=write_theme, input='y\n'),
+]
+
+
+def is_installed(module):
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+
+    return True
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else None
+
+
+def read_trace(path):
+    """
+    Read the request events of a trace written with `zenkly --trace-file`.
+    :param path: the trace path
+    :return list: the request durations in milliseconds
+    """
+    durations = []
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip().rstrip(',')
+
+            if line.startswith('{'):
+                event = json.loads(line)
+
+                if event['cat'] == 'request':
+                    durations.append(event['dur'] / 1000)
+
+    return durations
+
+
+def get_directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def start_server(options):
+    """
+    Start the stand-in server in a subprocess, on a free port.
+    :param options: server options
+    :return tuple: the server process, and its base url
+    """
+    args = [sys.executable, os.path.join(BENCHMARKS_DIR, 'mock_zendesk.py'), '--port', '0']
+
+    for name, value in options.items():
+        args.extend([f"--{name.replace('_', '-')}", str(value)])
+
+    server = subprocess.Popen(args, stdout=subprocess.PIPE, text=True)
+    line = server.stdout.readline()
+
+    if not line:
+        raise click.ClickException('The mock server did not start.')
+
+    return server, line.split()[-1]
+
+
+def make_environment(home, base_url, settings):
+    """
+    Create a throwaway zenkly config (and with it, cache and checkpoint
+    directories) under `home`, so benchmarks never touch the real ones.
+    :param home: the directory to use as home
+    :param base_url: the url of the stand-in server
+    :param settings: extra profile settings
+    :return tuple: the environment to run zenkly with, and the zenkly config directory
+    """
+    env = {**os.environ, 'HOME': home, 'XDG_CONFIG_HOME': home, 'APPDATA': home, 'USERPROFILE': home,
+           'PYTHONPATH': os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')]))}
+
+    with mock.patch.dict(os.environ, env):
+        app_dir = click.get_app_dir(APP_NAME)
+
+    os.makedirs(app_dir, exist_ok=True)
+
+    with open(os.path.join(app_dir, 'config.ini'), 'w') as f:
+        f.write('[default]\nsubdomain = bench\nemail = bench@example.com\npassword = bench\n')
+        f.write(f"base_url = {base_url}\n")
+
+        for name, value in settings.items():
+            f.write(f"{name} = {value}\n")
+
+    return env, app_dir
+
+
+def run_cli(args, env, work, input=None):
+    """
+    Run the CLI in a subprocess.
+    :return dict: the wall time, CPU time, peak RSS and exit code
+    """
+    rss_path = os.path.join(work, 'peak_rss')
+
+    with open(os.path.join(work, 'output.log'), 'w') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, '-c', CLI, *args], env={**env, 'ZENKLY_BENCHMARK_RSS': rss_path},
+                                   cwd=work, stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT, text=True)
+        process.stdin.write(input or '')
+        process.stdin.close()
+
+        if hasattr(os, 'wait4') and hasattr(os, 'waitstatus_to_exitcode'):
+            # wait4 gives the CPU time of this one process, where getrusage would sum up every child.
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            cpu = usage.ru_utime + usage.ru_stime
+        else:
+            process.wait()
+            cpu = None
+
+        wall = time.perf_counter() - start
+
+    peak_rss = None
+
+    if os.path.exists(rss_path):
+        with open(rss_path) as f:
+            peak_rss = int(f.read()) / 1024
+
+        os.remove(rss_path)
+
+    return {'exit_code': process.returncode, 'wall_s': wall, 'cpu_s': cpu, 'peak_rss_mb': peak_rss}
+
+
+def check_run(name, result, work, checkpoint_dir):
+    """
+    Fail on a run that failed, or that left page or write journals behind
+    although nothing was interrupted.
+    """
+    if result['exit_code'] != 0:
+        with open(os.path.join(work, 'output.log')) as f:
+            click.echo(f.read()[-2000:], err=True)
+
+        raise click.ClickException(f"{name} failed with exit code {result['exit_code']}")
+
+    journals = os.listdir(checkpoint_dir) if os.path.isdir(checkpoint_dir) else []
+
+    if journals:
+        raise click.ClickException(f"{name} left {len(journals)} journals behind in {checkpoint_dir}")
+
+
+def time_load(load, path):
+    start = time.perf_counter()
+    load(path)
+
+    return time.perf_counter() - start
+
+
+def run_scenario(scenario, env, app_dir, options, repeat):
+    """
+    Run a scenario `repeat` times, keeping the fastest run.
+    :return dict: the results
+    """
+    checkpoint_dir = os.path.join(app_dir, 'checkpoints')
+    best = None
+
+    for _ in range(repeat):
+        work = tempfile.mkdtemp(prefix=f"zenkly-{scenario.name}-")
+
+        try:
+            if scenario.setup:
+                scenario.setup(work, options)
+
+            if scenario.prepare:
+                prepared = run_cli([arg.format(work=work) for arg in scenario.prepare], env, work, scenario.input)
+                check_run(scenario.name, prepared, work, checkpoint_dir)
+                os.remove(os.path.join(work, 'output.log'))
+
+            # Input files and prepared output don't count towards the output size.
+            input_bytes = get_directory_size(work)
+            trace = os.path.join(work, 'trace.json')
+            args = ['--trace-file', trace] + [arg.format(work=work) for arg in scenario.args]
+            result = run_cli(args, env, work, scenario.input)
+            check_run(scenario.name, result, work, checkpoint_dir)
+
+            durations = read_trace(trace) if os.path.exists(trace) else []
+            os.remove(trace)
+            os.remove(os.path.join(work, 'output.log'))
+            records = scenario.records(options)
+
+            result.update(records=records, records_per_s=records / result['wall_s'], requests=len(durations),
+                          p50_ms=percentile(durations, 0.5), p95_ms=percentile(durations, 0.95),
+                          output_bytes=get_directory_size(work) - input_bytes, read_s=None)
+
+            if scenario.read:
+                filename, load = scenario.read
+                result['read_s'] = min(time_load(load, os.path.join(work, filename)) for _ in range(READ_REPEAT))
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+        if best is None or result['wall_s'] < best['wall_s']:
+            best = result
+
+    return best
+
+
+def read_output_files(work):
+    """
+    :return dict: the content of every file in `work` but the CLI log, by name
+    """
+    files = {}
+
+    for name in os.listdir(work):
+        if name != 'output.log':
+            with open(os.path.join(work, name), 'rb') as f:
+                files[name] = f.read()
+
+    return files
+
+
+def check_interrupted_exports(env, app_dir, options):
+    """
+    Check that an export whose list fails partway, in any format, keeps the
+    previous export intact and leaves no partial file behind.
+    """
+    server, base_url = start_server({**options, 'records': 250, 'fail_page': 2})
+    exports = [[], ['--format', 'ndjson', '--compress', 'gzip'], ['--format', 'csv']]
+
+    if is_installed('pyarrow'):
+        exports.append(['--format', 'parquet'])
+
+    try:
+        with open(os.path.join(app_dir, 'config.ini'), 'a') as f:
+            f.write(f"[failing]\nsubdomain = bench\nemail = bench@example.com\npassword = bench\n"
+                    f"base_url = {base_url}\nmax_attempts = 1\n")
+
+        for export in exports:
+            work = tempfile.mkdtemp(prefix='zenkly-check-')
+            name = ' '.join(['get-views', *export])
+
+            try:
+                args = ['get-views', '--directory', work, *export]
+                check_run(name, run_cli(args, env, work), work, os.path.join(app_dir, 'checkpoints'))
+                before = read_output_files(work)
+
+                if run_cli(['--profile', 'failing', *args], env, work)['exit_code'] == 0:
+                    raise click.ClickException(f"{name} succeeded although the server failed partway")
+
+                if read_output_files(work) != before:
+                    raise click.ClickException(f"{name} changed or left behind files when it failed partway")
+            finally:
+                shutil.rmtree(work, ignore_errors=True)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def check_deep_concurrent_list(env, app_dir, options):
+    """
+    Check that a concurrent export of more records than offset pagination
+    reaches still gets every one of them.
+    """
+    records = 105 * 100
+    server, base_url = start_server({**options, 'records': records})
+    work = tempfile.mkdtemp(prefix='zenkly-check-')
+
+    try:
+        with open(os.path.join(app_dir, 'config.ini'), 'a') as f:
+            f.write(f"[deep]\nsubdomain = bench\nemail = bench@example.com\npassword = bench\n"
+                    f"base_url = {base_url}\n")
+
+        result = run_cli(['--profile', 'deep', '--concurrency', '8', 'get-views', '--directory', work], env, work)
+        check_run('deep concurrent list', result, work, os.path.join(app_dir, 'checkpoints'))
+
+        with open(os.path.join(work, 'views.json')) as f:
+            listed = len(json.load(f)['views'])
+
+        if listed != records:
+            raise click.ClickException(f"A concurrent list of {records} records got {listed}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+        server.terminate()
+        server.wait()
+
+
+def measure_import_time(env, repeat):
+    """
+    :return float: the fewest milliseconds importing the CLI took, as reported by `python -X importtime`
+    """
+    times = []
+
+    for _ in range(repeat):
+        res = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import zenkly.scripts.zenkly'], env=env,
+                             capture_output=True, text=True, check=True)
+        line = next(line for line in res.stderr.splitlines() if line.endswith('| zenkly.scripts.zenkly'))
+        times.append(int(line.split('|')[1]) / 1000)
+
+    return min(times)
+
+
+def check_lazy_imports(env):
+    """
+    Check that a client for the default, sync engine leaves the async
+    engine's modules unloaded, as they would slow down every command.
+    """
+    code = ('import sys; from zenkly.scripts.client import get_client; '
+            "get_client({'subdomain': 'bench', 'email': 'bench@example.com', 'password': 'bench'}); "
+            "print(' '.join(name for name in ('aiohttp', 'asyncio') if name in sys.modules))")
+    res = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+
+    if res.stdout.strip():
+        raise click.ClickException(f"A sync client loaded {res.stdout.strip()}")
+
+
+def run_microbenchmarks(records, repeat):
+    """
+    Time the CPU-bound steps of an export on generated triggers, in this
+    process and without any HTTP.
+    :return dict: the results
+    """
+    from zenkly.scripts.utilities import flatten_rule, write_csv_stream
+    from zenkly.scripts.export import write_parquet
+
+    content = MockZendesk(records=records, guide_records=0, brands=1, latency=0, rate_limit=0, error_rate=0,
+                          drop_rate=0, change_rate=0, body_size=1, job_delay=0, seed=0, fail_page=0)
+    # Triggers are flattened in place, so every run gets fresh copies, made outside the timed part.
+    encoded = json.dumps([content.make_rule('triggers', i) for i in range(1, records + 1)])
+    results = {}
+
+    def timed(name, step):
+        def run():
+            triggers = json.loads(encoded)
+            start = time.process_time()
+            step(triggers)
+            return time.process_time() - start
+
+        seconds = min(run() for _ in range(repeat))
+        results[name] = {'records': records, 'cpu_s': seconds, 'records_per_s': records / seconds}
+
+    timed('flatten', lambda triggers: [flatten_rule(t) for t in triggers])
+    timed('write-csv', lambda triggers: write_csv_stream(io.StringIO(), (flatten_rule(t) for t in triggers)))
+
+    if is_installed('pyarrow'):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'triggers.parquet')
+            timed('write-parquet', lambda triggers: write_parquet(path, (flatten_rule(t) for t in triggers)))
+
+    return results
+
+
+def get_commit():
+    try:
+        res = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True)
+    except OSError:
+        return None
+
+    return res.stdout.strip() or None
+
+
+def compare_results(previous, current):
+    """
+    :return list: table rows of every metric of every scenario run in both, with the change
+    """
+    rows = []
+
+    for section in ('scenarios', 'microbenchmarks'):
+        for name, result in current.get(section, {}).items():
+            old = previous.get(section, {}).get(name)
+
+            if old is None:
+                continue
+
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                if result.get(metric) is None or not old.get(metric):
+                    continue
+
+                change = result[metric] / old[metric] - 1
+                better = change > 0 if higher_is_better else change < 0
+                rows.append([name, metric, f"{old[metric]:.3f}", f"{result[metric]:.3f}",
+                             click.style(f"{change:+.1%}", fg='green' if better else 'red')])
+
+    return rows
+
+
+@click.command()
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), default='benchmark_results.json',
+              show_default=True, help='File to write the results to.')
+@click.option('--compare', 'compare_path', type=click.Path(exists=True, dir_okay=False),
+              help='Results of an earlier run to compare with.')
+@click.option('--scenario', 'names', multiple=True, help='Only run these scenarios (repeatable).')
+@click.option('--list', 'list_scenarios', is_flag=True, help='List the scenarios and exit.')
+@click.option('--repeat', type=click.IntRange(min=1), default=3, show_default=True,
+              help='Runs of each scenario, of which the fastest is kept.')
+@click.option('--records', type=click.IntRange(min=1), default=2000, show_default=True,
+              help='Macros, triggers, automations and views each.')
+@click.option('--guide-records', type=click.IntRange(min=1), default=2000, show_default=True,
+              help='Articles per help center.')
+@click.option('--brands', type=click.IntRange(min=1), default=2, show_default=True)
+@click.option('--latency', type=click.FloatRange(min=0), default=0.02, show_default=True,
+              help='Seconds the server adds to every response.')
+@click.option('--rate-limit', type=click.IntRange(min=0), default=0, show_default=True,
+              help='Requests per minute the server allows, 0 for no limit.')
+@click.option('--error-rate', type=click.FloatRange(0, 1), default=0, show_default=True,
+              help='Share of requests the server answers with a 502, 503 or 504.')
+@click.option('--drop-rate', type=click.FloatRange(0, 1), default=0, show_default=True,
+              help='Share of requests whose connection the server closes without answering.')
+@click.option('--setting', 'settings', multiple=True, metavar='NAME=VALUE',
+              help='Extra zenkly profile setting, e.g. retry_backoff=0.1 (repeatable).')
+@click.option('--micro-records', type=click.IntRange(min=1), default=20000, show_default=True,
+              help='Triggers to flatten and export in the microbenchmarks.')
+@click.option('--max-import-ms', type=click.FloatRange(min=0),
+              help='Fail if importing the CLI takes longer than this, as a startup regression check.')
+def main(output, compare_path, names, list_scenarios, repeat, records, guide_records, brands, latency, rate_limit,
+         error_rate, drop_rate, settings, micro_records, max_import_ms):
+    """Benchmark the zenkly CLI against a stand-in Zendesk server."""
+    if list_scenarios:
+        for s in SCENARIOS:
+            click.echo(s.name)
+        return
+
+    unknown = set(names) - {s.name for s in SCENARIOS}
+
+    if unknown:
+        raise click.BadParameter(f"Unknown scenarios: {', '.join(sorted(unknown))}", param_hint='--scenario')
+
+    options = {'records': records, 'guide_records': guide_records, 'brands': brands, 'latency': latency,
+               'rate_limit': rate_limit, 'error_rate': error_rate, 'drop_rate': drop_rate, 'change_rate': 0.01,
+               'body_size': 2000, 'job_delay': 0.5, 'seed': 0, 'fail_page': 0}
+    settings = dict(setting.split('=', 1) for setting in settings)
+    results = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'server': options,
+        'settings': settings,
+        'scenarios': {},
+        'microbenchmarks': {},
+    }
+
+    server, base_url = start_server(options)
+    home = tempfile.mkdtemp(prefix='zenkly-home-')
+
+    try:
+        env, app_dir = make_environment(home, base_url, settings)
+        results['import_ms'] = measure_import_time(env, repeat=max(repeat, 5))
+        click.echo(f"import: {results['import_ms']:.0f} ms")
+        check_lazy_imports(env)
+
+        for s in SCENARIOS:
+            if names and s.name not in names:
+                continue
+
+            if s.requires and not is_installed(s.requires):
+                click.echo(f"{s.name}: skipped, {s.requires} is not installed")
+                continue
+
+            result = results['scenarios'][s.name] = run_scenario(s, env, app_dir, options, repeat)
+            click.echo(f"{s.name}: {result['wall_s']:.2f} s, {result['records_per_s']:.0f} records/s, "
+                       f"{result['requests']} requests, {result['peak_rss_mb'] or 0:.0f} MB"
+                       + (f", {result['output_bytes'] / 1024:.0f} KB read in {result['read_s']:.2f} s"
+                          if result['read_s'] is not None else ''))
+
+        if not names:
+            check_interrupted_exports(env, app_dir, options)
+            click.echo('interrupted exports: ok')
+            check_deep_concurrent_list(env, app_dir, options)
+            click.echo('deep concurrent list: ok')
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(home, ignore_errors=True)
+
+    if not names:
+        results['microbenchmarks'] = run_microbenchmarks(micro_records, repeat)
+
+        for name, result in results['microbenchmarks'].items():
+            click.echo(f"{name}: {result['cpu_s']:.2f} s, {result['records_per_s']:.0f} records/s")
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    click.echo(f"Results saved to {output}")
+
+    if compare_path:
+        from tabulate import tabulate
+
+        with open(compare_path) as f:
+            previous = json.load(f)
+
+        click.echo()
+        click.echo(f"Compared with {previous.get('commit') or compare_path}:")
+        click.echo(tabulate(compare_results(previous, results), headers=['Benchmark', 'Metric', 'Before', 'After',
+                                                                         'Change']))
+
+    if max_import_ms is not None and results['import_ms'] > max_import_ms:
+        raise click.ClickException(f"Importing the CLI took {results['import_ms']:.0f} ms, "
+                                   f"more than the {max_import_ms:.0f} ms allowed.")
+
+
+if __name__ == '__main__':
+    main()
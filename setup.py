@@ -16,7 +16,7 @@ setup(
     include_package_data=True,
     package_data={'zenkly': ['schemas/*.schema']},
     install_requires=[
-        'Click',
+        'Click>=8.0',
         'simplejson',
         'requests',
         'jsonschema',
@@ -25,9 +25,14 @@ setup(
         'gitpython',
         'tabulate',
     ],
+    extras_require={
+        'async': ['aiohttp'],
+        'parquet': ['pyarrow'],
+        'zstd': ['zstandard'],
+    },
     entry_points='''
         [console_scripts]
         zenkly=zenkly.scripts.zenkly:cli
     ''',
-    python_requires='>=3.6',
+    python_requires='>=3.7',
 )
\ No newline at end of file
@@ -0,0 +1,114 @@
+import io
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import zipfile
+import click
+from .utilities import write_json_stream, write_csv_rows
+
+
+# Characters an entry waiting for its turn keeps in memory before it spills to a temporary file.
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+
+def write_entry(f, filename, data):
+    """
+    Write the data of an entry, as JSON or CSV depending on the filename.
+    :param f: text file open for writing
+    :param filename: the entry name, e.g. articles.json
+    :param data: a dict, or an iterable of items
+    """
+    if filename.endswith('.csv'):
+        write_csv_rows(f, data)
+    elif isinstance(data, dict):
+        json.dump(data, f, indent=4)
+    else:
+        write_json_stream(f, data, indent=4)
+
+
+class ArchiveWriter:
+    """
+    Zip archive written entry by entry as the data arrives, instead of
+    writing a directory and zipping it afterwards. The archive only gets
+    its final name once it is complete.
+
+    A zip can only have one entry open for writing. Entries written from
+    several threads take turns: the first streams straight into the
+    archive, and the others are written to temporary files while they
+    wait, which are kept in memory only while they are small. The data of
+    a waiting entry is consumed as it arrives either way.
+    """
+
+    def __init__(self, path, compression_level=None):
+        """
+        :param path: the archive path, e.g. backup_1600000000.zip
+        :param compression_level: deflate level from 0 (none) to 9 (smallest), defaults to zlib's
+        """
+        self.path = path
+        self.partial_path = f"{path}.partial"
+        self.zip = zipfile.ZipFile(self.partial_path, 'w', compression=zipfile.ZIP_DEFLATED,
+                                   compresslevel=compression_level)
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def write(self, filename, data):
+        """
+        Write one entry, as JSON or CSV depending on the filename.
+        :param filename: the entry name, e.g. articles.json
+        :param data: a dict, or an iterable of items
+        """
+        spool = None
+
+        if not self.lock.acquire(blocking=False):
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+', encoding='utf-8', newline='',
+                                                  dir=os.path.dirname(self.partial_path) or None)
+
+            try:
+                write_entry(spool, filename, data)
+            except BaseException:
+                spool.close()
+                raise
+
+            self.lock.acquire()
+
+        try:
+            click.echo(f"Writing data to {click.format_filename(self.path, shorten=True)}:{filename}")
+
+            # Entries may outgrow 2 GB, which needs zip64 since the size is not known up front.
+            with io.TextIOWrapper(self.zip.open(filename, 'w', force_zip64=True), encoding='utf-8',
+                                  newline='') as f:
+                if spool is None:
+                    write_entry(f, filename, data)
+                else:
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, f)
+
+            # Entries opened by name are dated 1980, so date them like the files of an archived directory. Unzip
+            # tools read dates and permissions from the central directory, which is written from this info on close.
+            entry = self.zip.getinfo(filename)
+            entry.date_time = time.localtime()[:6]
+            entry.external_attr = 0o644 << 16
+        finally:
+            self.lock.release()
+
+            if spool is not None:
+                spool.close()
+
+    def close(self):
+        self.zip.close()
+        os.replace(self.partial_path, self.path)
+
+    def discard(self):
+        self.zip.close()
+        os.remove(self.partial_path)
@@ -0,0 +1,146 @@
+import json
+import time
+import asyncio
+import threading
+import click
+from .metrics import get_metrics
+from .client import route_url, get_request_timeout
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncClient:
+    """
+    asyncio transport for one Zendesk account. Runs an event loop in a
+    background thread so the rest of zenkly can stay synchronous: batches
+    of requests are handed to the loop, sent with up to `concurrency` in
+    flight, and their results are read back in order. Shares the rate
+    limiter and retry policy of the synchronous client.
+    """
+
+    def __init__(self, config, limiter, retry):
+        """
+        :param config: context config
+        :param limiter: the rate limiter shared with the synchronous client
+        :param retry: the retry policy shared with the synchronous client
+        """
+        if aiohttp is None:
+            raise click.UsageError('The async engine needs aiohttp. Install it with `pip install zenkly[async]`.')
+
+        self.limiter = limiter
+        self.retry = retry
+        self.base_url = config.get('base_url')
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.session = self._run(self._create_session(config['email'], config['password'],
+                                                      get_request_timeout(config))).result()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def _create_session(self, email, password, timeout):
+        connect_timeout, read_timeout = timeout
+
+        # No connector limit: the number of connections is bounded by the semaphore of each batch.
+        return aiohttp.ClientSession(auth=aiohttp.BasicAuth(email, password),
+                                     connector=aiohttp.TCPConnector(limit=0),
+                                     timeout=aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout,
+                                                                   sock_read=read_timeout))
+
+    async def _create_semaphore(self, concurrency):
+        return asyncio.Semaphore(concurrency)
+
+    async def _request(self, semaphore, method, url, payload):
+        kwargs = {'params': payload} if method == 'GET' else {'json': payload}
+        url, kwargs['headers'] = route_url(url, self.base_url)
+
+        metrics = get_metrics()
+
+        async with semaphore:
+            attempt = 0
+
+            while True:
+                start = time.perf_counter()
+                await self.limiter.acquire_async()
+
+                if metrics:
+                    metrics.record_wait('rate limit', start, time.perf_counter() - start)
+                    start = time.perf_counter()
+
+                try:
+                    async with self.session.request(method, url, **kwargs) as r:
+                        content = await r.read()
+                        body = content.decode(r.get_encoding())
+                        self.limiter.update(r.status, r.headers)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+                    if metrics:
+                        metrics.record_request(method, url, type(err).__name__, start, time.perf_counter() - start, 0)
+
+                    if not self.retry.should_retry(method, attempt, error=err):
+                        raise click.ClickException(f"{type(err).__name__}: {err} for url: {url}")
+
+                    delay = self.retry.get_delay(attempt, type(err).__name__)
+                else:
+                    if metrics:
+                        metrics.record_request(method, str(r.url), r.status, start, time.perf_counter() - start,
+                                               len(content))
+
+                    if not self.retry.should_retry(method, attempt, status_code=r.status):
+                        break
+
+                    delay = self.retry.get_delay(attempt, r.status, r.headers)
+
+                if metrics:
+                    metrics.record_wait('retry', time.perf_counter(), delay)
+
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        # Check for HTTP errors (4xx, 5xx), as `utilities.get` does.
+        if r.status >= 400:
+            kind = 'Client' if r.status < 500 else 'Server'
+            raise click.ClickException(f"{r.status} {kind} Error: {r.reason} for url: {r.url}")
+
+        try:
+            res = json.loads(body)
+        except ValueError as err:
+            raise click.ClickException(err)
+
+        if 'error' in res:
+            raise click.ClickException(res['error'])
+
+        return res
+
+    def fetch_all(self, batch, concurrency=1, return_exceptions=False):
+        """
+        Send a batch of requests concurrently.
+        :param batch: list of (method, url, payload) tuples; payload is the query params of a GET, else the
+            JSON body
+        :param concurrency: max requests in flight
+        :param return_exceptions: flag to yield a failed request's `click.ClickException` instead of raising it
+        :return: generator of parsed JSON responses, in request order
+        """
+        semaphore = self._run(self._create_semaphore(concurrency)).result()
+        futures = [self._run(self._request(semaphore, method, url, payload)) for method, url, payload in batch]
+
+        try:
+            for future in futures:
+                try:
+                    yield future.result()
+                except click.ClickException as err:
+                    if not return_exceptions:
+                        raise
+
+                    yield err
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        self._run(self.session.close()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
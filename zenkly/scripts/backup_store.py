@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+from .utilities import confirm_or_create_path
+
+OBJECTS_DIRNAME = 'objects'
+MANIFESTS_DIRNAME = 'manifests'
+
+
+def object_path(store_path, object_hash):
+    return os.path.join(store_path, OBJECTS_DIRNAME, object_hash[:2], f"{object_hash[2:]}.json")
+
+
+def write_object(store_path, item):
+    """
+    Store an item under the hash of its content, unless it is stored already.
+    :param store_path: the store directory
+    :param item: the item to store
+    :return tuple: the object hash, and the path written (None if the object already existed)
+    """
+    content = json.dumps(item, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    object_hash = hashlib.sha256(content).hexdigest()
+    path = object_path(store_path, object_hash)
+
+    if os.path.exists(path):
+        return object_hash, None
+
+    confirm_or_create_path(os.path.dirname(path))
+
+    # Write to a temporary file first so an interrupted run never leaves a truncated object behind.
+    with open(f"{path}.tmp", 'wb') as f:
+        f.write(content)
+    os.replace(f"{path}.tmp", path)
+
+    return object_hash, path
+
+
+def write_objects(store_path, items):
+    """
+    Store items as content-addressed objects.
+    :param store_path: the store directory
+    :param items: the items to store
+    :return tuple: the list of object hashes in item order, and the list of paths written
+    """
+    hashes = []
+    written = []
+
+    for item in items:
+        object_hash, path = write_object(store_path, item)
+        hashes.append(object_hash)
+
+        if path:
+            written.append(path)
+
+    return hashes, written
+
+
+def read_object(store_path, object_hash):
+    with open(object_path(store_path, object_hash), 'r') as f:
+        return json.load(f)
+
+
+def read_objects(store_path, hashes):
+    """
+    Read stored objects.
+    :param store_path: the store directory
+    :param hashes: the object hashes
+    :return: generator of items
+    """
+    for object_hash in hashes:
+        yield read_object(store_path, object_hash)
+
+
+def write_manifest(store_path, manifest):
+    """
+    Write the manifest of one backup run.
+    :param store_path: the store directory
+    :param manifest: dict with the backup time and the object hashes per type
+    :return: the manifest path
+    """
+    manifests_path = os.path.join(store_path, MANIFESTS_DIRNAME)
+    confirm_or_create_path(manifests_path)
+
+    path = os.path.join(manifests_path, f"{manifest['backup_time']}.json")
+
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+
+    return path
+
+
+def list_manifests(store_path):
+    """
+    List the backup times of every manifest in a store, oldest first.
+    :param store_path: the store directory
+    :return list: backup times
+    """
+    manifests_path = os.path.join(store_path, MANIFESTS_DIRNAME)
+
+    if not os.path.isdir(manifests_path):
+        return []
+
+    return sorted(int(name[:-len('.json')]) for name in os.listdir(manifests_path) if name.endswith('.json'))
+
+
+def read_manifest(store_path, backup_time):
+    with open(os.path.join(store_path, MANIFESTS_DIRNAME, f"{backup_time}.json"), 'r') as f:
+        return json.load(f)
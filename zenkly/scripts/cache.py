@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import click
+from .constants import APP_NAME
+
+DEFAULT_CACHE_TTL = 300  # seconds
+DEFAULT_CACHE_MAX_SIZE = 100  # megabytes
+# Share of the max size eviction frees the cache down to, so a full cache isn't listed again on every write.
+EVICTION_TARGET = 0.9
+STATS_FILENAME = 'stats.json'
+STAT_KEYS = ('hits', 'revalidated', 'misses', 'bytes_saved')
+
+
+def get_cache_dir():
+    return os.path.join(click.get_app_dir(APP_NAME), 'cache')
+
+
+def read_cache_stats(cache_dir):
+    """
+    Read the cache statistics accumulated across invocations.
+    :param cache_dir: the cache directory
+    :return dict: counts of hits, revalidated, misses and bytes_saved
+    """
+    try:
+        with open(os.path.join(cache_dir, STATS_FILENAME), 'r') as f:
+            return {**dict.fromkeys(STAT_KEYS, 0), **json.load(f)}
+    except (OSError, ValueError):
+        return dict.fromkeys(STAT_KEYS, 0)
+
+
+def list_cache_entries(cache_dir):
+    """
+    List the entries in the cache, least recently used first.
+    :param cache_dir: the cache directory
+    :return list: (path, size, last used) tuples
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+
+    entries = []
+
+    for name in os.listdir(cache_dir):
+        if name.endswith('.json') and name != STATS_FILENAME:
+            try:
+                stat = os.stat(os.path.join(cache_dir, name))
+            except OSError:
+                continue  # evicted since the listing
+
+            entries.append((os.path.join(cache_dir, name), stat.st_size, stat.st_mtime))
+
+    return sorted(entries, key=lambda entry: entry[2])
+
+
+class ResponseCache:
+    """
+    On-disk cache of GET responses for one Zendesk account. Fresh entries
+    (younger than the TTL) are answered without a request; stale ones are
+    revalidated with `If-None-Match`/`If-Modified-Since`, so an unchanged
+    resource costs a 304 instead of a full download. Entries are evicted
+    least recently used first once the cache grows past its max size.
+    The size is kept as a running total, so the cache directory is only
+    listed on the first write and whenever the total goes over the max.
+    """
+
+    def __init__(self, config, cache_dir=None):
+        """
+        :param config: context config
+        :param cache_dir: the cache directory, defaults to one in the app dir
+        """
+        self.cache_dir = cache_dir or get_cache_dir()
+        self.ttl = int(config.get('cache_ttl', DEFAULT_CACHE_TTL))
+        self.max_bytes = int(config.get('cache_max_size', DEFAULT_CACHE_MAX_SIZE)) * 1024 * 1024
+        self.account = f"{config.get('subdomain')}:{config.get('email')}"
+        self.stats = dict.fromkeys(STAT_KEYS, 0)
+        self.size = None  # bytes in the cache, counted on the first write
+        self.lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, url, params):
+        key = json.dumps([self.account, url, sorted((params or {}).items())], default=str)
+        return os.path.join(self.cache_dir, f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json")
+
+    def _count(self, stat, amount=1):
+        with self.lock:
+            self.stats[stat] += amount
+
+    def request(self, send, url, params=None, **kwargs):
+        """
+        Answer a GET from the cache where possible.
+        :param send: function sending the GET, called like send(url, params=..., headers=..., **kwargs)
+        :param url: the url to GET
+        :param params: query params
+        :return: the response
+        """
+        path = self._path(url, params)
+        entry = self._read(path)
+
+        if entry and time.time() - entry['stored_at'] < self.ttl:
+            self._count('hits')
+            self._count('bytes_saved', len(entry['body']))
+            try:
+                os.utime(path)  # mark as recently used
+            except OSError:
+                pass  # evicted by another thread since it was read
+
+            return self._to_response(entry)
+
+        headers = dict(kwargs.pop('headers', None) or {})
+
+        if entry and entry['headers'].get('ETag'):
+            headers['If-None-Match'] = entry['headers']['ETag']
+
+        if entry and entry['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+
+        r = send(url, params=params, headers=headers, **kwargs)
+
+        if r.status_code == 304 and entry:
+            self._count('revalidated')
+            self._count('bytes_saved', len(entry['body']))
+            entry['stored_at'] = time.time()
+            self._write(path, entry)
+            return self._to_response(entry)
+
+        self._count('misses')
+
+        if r.status_code == 200:
+            self._write(path, {
+                'url': r.url,
+                'stored_at': time.time(),
+                'headers': {k: r.headers[k] for k in ('ETag', 'Last-Modified', 'Content-Type') if k in r.headers},
+                'body': r.text,
+            })
+            self._evict()
+
+        return r
+
+    def _read(self, path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path, entry):
+        # Write to a temporary file first so concurrent readers never see a partial entry.
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+            size = f.tell()
+
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            if self.size is not None:
+                self.size += size - replaced
+
+    def _evict(self):
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for _, size, _ in list_cache_entries(self.cache_dir))
+
+            if self.size <= self.max_bytes:
+                return
+
+            # Other invocations may have written to the cache too, so the total is corrected from a listing.
+            entries = list_cache_entries(self.cache_dir)
+            total = sum(size for _, size, _ in entries)
+
+            for path, size, _ in entries:
+                if total <= self.max_bytes * EVICTION_TARGET:
+                    break
+
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+                total -= size
+
+            self.size = total
+
+    def _to_response(self, entry):
+        import requests
+
+        r = requests.Response()
+        r.status_code = 200
+        r.url = entry['url']
+        r.headers.update(entry['headers'])
+        r.encoding = 'utf-8'
+        r._content = entry['body'].encode('utf-8')
+
+        return r
+
+    def save_stats(self):
+        """
+        Add the statistics of this invocation to the stored totals.
+        """
+        with self.lock:
+            totals = read_cache_stats(self.cache_dir)
+
+            for stat in STAT_KEYS:
+                totals[stat] += self.stats[stat]
+
+            self.stats = dict.fromkeys(STAT_KEYS, 0)
+
+            with open(os.path.join(self.cache_dir, STATS_FILENAME), 'w') as f:
+                json.dump(totals, f, indent=4)
@@ -0,0 +1,189 @@
+import os
+import json
+import hashlib
+import threading
+import click
+from .constants import APP_NAME
+
+_checkpoint_options = {'checkpoint': False, 'resume': False}
+
+
+def set_checkpoint_options(checkpoint=False, resume=False):
+    """
+    Set whether fetched pages are journaled, and whether journals left by
+    an interrupted run are resumed. Without resume, they are discarded and
+    every list or batch starts over.
+    :param checkpoint: flag to journal the pages of every list, which a resumed run also does
+    :param resume: flag to continue from existing journals
+    """
+    _checkpoint_options['checkpoint'] = checkpoint or resume
+    _checkpoint_options['resume'] = resume
+
+
+def get_checkpoint_dir():
+    return os.path.join(click.get_app_dir(APP_NAME), 'checkpoints')
+
+
+def get_checkpoint_path(config, kind, *parts):
+    """
+    Get the path of the journal of one list or batch of one account.
+    :param config: context config
+    :param kind: the kind of journal, used as the file extension
+    :param parts: JSON-serializable values identifying the list or batch
+    :return: the journal path, without extension
+    """
+    key = json.dumps([config.get('subdomain'), config.get('email'), *parts], default=str)
+
+    return os.path.join(get_checkpoint_dir(), f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.{kind}")
+
+
+def open_journal(path):
+    """
+    Check whether a journal should be resumed, discarding it otherwise.
+    :param path: the journal path
+    :return bool: whether the journal exists and is resumed
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if not os.path.exists(path):
+        return False
+
+    if _checkpoint_options['resume']:
+        return True
+
+    click.echo('Discarding the progress of an interrupted run. Use `zenkly --resume` to continue it instead.')
+    os.remove(path)
+
+    return False
+
+
+class PageJournal:
+    """
+    Journal of the pages of one list fetched so far. After every page, its
+    records are appended to a spill file and the position of the next page
+    (a cursor url or a page number) is saved, so a run that fails or is
+    interrupted can be resumed from the last good page: the spilled
+    records are replayed and fetching continues where it stopped.
+
+    As the spill file is a copy of every record, pages are only journaled
+    when asked for with `zenkly --checkpoint` (or `--resume`). Otherwise
+    the journal does nothing.
+    """
+
+    def __init__(self, config, url, params, mode):
+        """
+        :param config: context config
+        :param url: the url of the list endpoint
+        :param params: query params of the list
+        :param mode: the pagination mode, as positions of one mode mean nothing to the other
+        """
+        path = get_checkpoint_path(config, 'pages', url, sorted(params.items()), mode)
+        self.state_path = f"{path}.json"
+        self.records_path = f"{path}.jsonl"
+        self.state = {'position': None, 'size': 0, 'finished': False}
+        self.enabled = _checkpoint_options['checkpoint']
+        self.resumed = self.enabled and open_journal(self.state_path)
+
+        if self.resumed:
+            with open(self.state_path, 'r') as f:
+                self.state = json.load(f)
+        elif self.enabled and os.path.exists(self.records_path):
+            os.remove(self.records_path)
+
+    @property
+    def position(self):
+        return self.state['position']
+
+    @property
+    def finished(self):
+        return self.state['finished']
+
+    def replay(self):
+        """
+        Read back the records of the pages fetched by the interrupted run.
+        :return: generator of records
+        """
+        if not self.resumed:
+            return
+
+        with open(self.records_path, 'r+') as f:
+            # Drop records appended after the last saved position, i.e. by a page that was cut short.
+            f.truncate(self.state['size'])
+
+            for line in f:
+                yield json.loads(line)
+
+    def record(self, records, position):
+        """
+        Save the records of a page and the position of the next page.
+        :param records: the records of the page
+        :param position: the position of the next page, None after the last page
+        """
+        if not self.enabled:
+            return
+
+        with open(self.records_path, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+            size = f.tell()
+
+        self.state = {'position': position, 'size': size, 'finished': position is None}
+
+        with open(f"{self.state_path}.tmp", 'w') as f:
+            json.dump(self.state, f)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+    def finish(self):
+        if not self.enabled:
+            return
+
+        for path in (self.state_path, self.records_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class ApplyJournal:
+    """
+    Journal of the items of one batch of writes (e.g. macros to create)
+    that were already applied, so a retried run skips them instead of
+    applying them twice.
+    """
+
+    def __init__(self, config, operation, item_ids):
+        """
+        :param config: context config
+        :param operation: the name of the write, e.g. post_macros
+        :param item_ids: the ids of every item in the batch
+        """
+        self.path = get_checkpoint_path(config, 'applied', operation, sorted(map(str, item_ids)))
+        self.applied = {}
+        self.lock = threading.Lock()
+
+        if open_journal(self.path):
+            with open(self.path, 'r') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.applied[entry['id']] = entry['result']
+
+    def is_applied(self, item_id):
+        return str(item_id) in self.applied
+
+    def get_result(self, item_id):
+        return self.applied[str(item_id)]
+
+    def record(self, item_id, result=None):
+        """
+        Save that an item was applied.
+        :param item_id: the item id
+        :param result: JSON-serializable result to report when the item is skipped, e.g. the id it was created with
+        """
+        with self.lock:
+            self.applied[str(item_id)] = result
+
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({'id': str(item_id), 'result': result}) + '\n')
+
+    def finish(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,437 @@
+import re
+import time
+import random
+import threading
+from collections import Counter
+import click
+from .constants import MAX_ATTEMPTS
+from .metrics import get_metrics
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RATE_LIMIT = 60  # requests per minute until Zendesk reports the real budget
+DEFAULT_RETRY_BACKOFF = 1.0  # seconds
+MAX_RETRY_BACKOFF = 60.0  # seconds
+DEFAULT_REQUEST_TIMEOUT = (10.0, 60.0)  # seconds to connect, and to wait for the server between bytes
+
+# The host of every Zendesk API url, e.g. https://mysubdomain.zendesk.com
+ZENDESK_URL = re.compile(r'^https://(?P<subdomain>[\w-]+)\.zendesk\.com(?=/|$)')
+
+_clients = {}
+_clients_lock = threading.Lock()
+_client_options = {}
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every request to one Zendesk account, across
+    all HTTP verbs and threads. The refill rate follows the
+    `X-Rate-Limit` header Zendesk sends back (capped by the configured
+    limit, if any), the bucket is drained to `X-Rate-Limit-Remaining`,
+    and a 429 blocks all requests until `Retry-After` has passed.
+    """
+
+    def __init__(self, rate_limit=None):
+        """
+        :param rate_limit: max requests per minute, or None to use the budget Zendesk reports
+        """
+        self.max_per_minute = rate_limit
+        self.per_minute = rate_limit or DEFAULT_RATE_LIMIT
+        self.tokens = 1.0
+        self.blocked_until = 0.0
+        self.last_refill = time.perf_counter()
+        self.lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        # Allow up to one second worth of requests to go out in a burst.
+        return max(1.0, self.per_minute / 60.0)
+
+    def _refill(self, now):
+        elapsed = now - self.last_refill
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.per_minute / 60.0)
+        self.last_refill = now
+
+    def reserve(self):
+        """
+        Take a token if one is available, without blocking.
+        :return float: 0 if a request may be sent now, otherwise the seconds to wait before trying again
+        """
+        with self.lock:
+            now = time.perf_counter()
+            self._refill(now)
+
+            if now >= self.blocked_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+
+            return max(self.blocked_until - now, (1 - self.tokens) * 60.0 / self.per_minute)
+
+    def acquire(self):
+        """
+        Block until a request may be sent.
+        """
+        left_to_wait = self.reserve()
+
+        while left_to_wait > 0:
+            time.sleep(left_to_wait)
+            left_to_wait = self.reserve()
+
+    async def acquire_async(self):
+        """
+        Wait, without blocking the event loop, until a request may be sent.
+        """
+        import asyncio
+
+        left_to_wait = self.reserve()
+
+        while left_to_wait > 0:
+            await asyncio.sleep(left_to_wait)
+            left_to_wait = self.reserve()
+
+    def update(self, status_code, headers):
+        """
+        Adjust the bucket from the rate limit headers of a response.
+        :param status_code: the response status code
+        :param headers: the response headers
+        """
+        limit = _int_header(headers, 'X-Rate-Limit')
+        remaining = _int_header(headers, 'X-Rate-Limit-Remaining')
+        retry_after = _int_header(headers, 'Retry-After')
+
+        with self.lock:
+            now = time.perf_counter()
+            self._refill(now)
+
+            if limit:
+                self.per_minute = min(limit, self.max_per_minute or limit)
+
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining)
+
+            if status_code == 429:
+                self.tokens = 0
+                self.blocked_until = max(self.blocked_until, now + (retry_after or 60.0 / self.per_minute))
+
+
+class RetryPolicy:
+    """
+    Decides which failed requests to send again and how long to wait first,
+    and counts the retries of one Zendesk account. Waits follow
+    `Retry-After` when Zendesk sends it, and otherwise back off
+    exponentially with full jitter, so threads that failed together don't
+    retry together. A 429 is always retried, as Zendesk rejected the
+    request without processing it; other failures are only retried for
+    idempotent methods, or for POST when `retry_post` is set.
+    """
+
+    RETRY_STATUSES = {429, 502, 503, 504}
+    IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS, backoff=DEFAULT_RETRY_BACKOFF, retry_post=False):
+        """
+        :param max_attempts: max times a request is sent, including the first
+        :param backoff: the base wait in seconds, doubled on every retry
+        :param retry_post: flag to also retry POST requests that may have been processed
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.retry_post = retry_post
+        self.retries = Counter()
+        self.waited = 0.0
+        self.lock = threading.Lock()
+
+    def should_retry(self, method, attempt, status_code=None, error=None):
+        """
+        :param method: the HTTP method
+        :param attempt: the number of the failed attempt, from 0
+        :param status_code: the response status code, if a response came back
+        :param error: the connection error, if none did
+        :return bool: whether to send the request again
+        """
+        if attempt + 1 >= self.max_attempts:
+            return False
+
+        if status_code == 429:
+            return True
+
+        if method not in self.IDEMPOTENT_METHODS and not (method == 'POST' and self.retry_post):
+            return False
+
+        return error is not None or status_code in self.RETRY_STATUSES
+
+    def get_delay(self, attempt, reason, headers=None):
+        """
+        Get how long to wait before the next attempt, and count the retry.
+        :param attempt: the number of the failed attempt, from 0
+        :param reason: the status code or error the attempt failed with
+        :param headers: the response headers, if a response came back
+        :return float: seconds to wait
+        """
+        delay = _int_header(headers or {}, 'Retry-After')
+
+        if delay is None:
+            delay = random.uniform(0, min(MAX_RETRY_BACKOFF, self.backoff * 2 ** attempt))
+
+        with self.lock:
+            self.retries[str(reason)] += 1
+            self.waited += delay
+
+        return delay
+
+    def report(self):
+        """
+        :return: a summary of the retries, or None if there were none
+        """
+        if not self.retries:
+            return None
+
+        reasons = ', '.join(f"{reason}: {count}" for reason, count in self.retries.most_common())
+
+        return f"Retried {sum(self.retries.values())} requests ({reasons}), waiting {self.waited:.1f}s in total."
+
+
+def _parse_flag(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _int_header(headers, name):
+    try:
+        return int(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_request_timeout(config):
+    """
+    Get the timeouts of every request from the `request_timeout` setting,
+    which is either one number of seconds for both, or `connect, read`.
+    :param config: context config
+    :return tuple: the connect and read timeouts in seconds
+    """
+    value = config.get('request_timeout')
+
+    if value is None:
+        return DEFAULT_REQUEST_TIMEOUT
+
+    try:
+        timeouts = tuple(float(part) for part in str(value).split(','))
+    except ValueError:
+        timeouts = ()
+
+    if len(timeouts) not in (1, 2) or min(timeouts) <= 0:
+        raise click.UsageError(f"Invalid request_timeout `{value}`. Use seconds, e.g. `60` or `10, 60`.")
+
+    return timeouts * 2 if len(timeouts) == 1 else timeouts
+
+
+def _get_file_positions(files):
+    """
+    Get where the file objects of a multipart request start, so they can be
+    rewound for a retry. Sending a request reads its files to the end.
+    :param files: the files of the request, as given to requests
+    :return list: (file, position) pairs, or None if a file can't be rewound
+    """
+    values = files.values() if isinstance(files, dict) else [value for _, value in files or []]
+    positions = []
+
+    for value in values:
+        f = value[1] if isinstance(value, tuple) else value
+
+        if not hasattr(f, 'read'):
+            continue
+
+        if not (hasattr(f, 'seekable') and f.seekable()):
+            return None
+
+        positions.append((f, f.tell()))
+
+    return positions
+
+
+def route_url(url, base_url):
+    """
+    Send a request for a Zendesk url to another server instead, e.g. the
+    stand-in server in benchmarks/. The Zendesk host is kept in the Host
+    header, so the server can still tell the brands of an account apart.
+    :param url: the url to request
+    :param base_url: the url of the server, e.g. http://127.0.0.1:8765, or None to send urls to Zendesk
+    :return tuple: the url to request, and the headers to add to the request
+    """
+    match = ZENDESK_URL.match(url) if base_url else None
+
+    if match is None:
+        return url, {}
+
+    return base_url.rstrip('/') + url[match.end():], {'Host': f"{match.group('subdomain')}.zendesk.com"}
+
+
+class Client:
+    """
+    HTTP client for one Zendesk account. Holds a pooled, keep-alive
+    `requests.Session`, so every request made through it reuses open
+    connections instead of a new TCP+TLS handshake per call.
+    """
+
+    def __init__(self, config, pool_size=None, cache=False, engine='sync'):
+        """
+        :param config: context config
+        :param pool_size: max connections kept open per host
+        :param cache: flag to answer GET requests from the on-disk response cache where possible
+        :param engine: 'async' to send concurrent batches of requests with asyncio instead of threads
+        """
+        # requests and aiohttp are slow to import, so they are only loaded once a command needs a client, and
+        # aiohttp only for the async engine.
+        import requests
+        from requests.adapters import HTTPAdapter
+        from .cache import ResponseCache
+
+        if pool_size is None:
+            pool_size = int(config.get('pool_size', DEFAULT_POOL_SIZE))
+
+        rate_limit = config.get('rate_limit')
+
+        self.pool_size = pool_size
+        self.subdomain = config.get('subdomain')
+        self.base_url = config.get('base_url')
+        self.timeout = get_request_timeout(config)
+        self.limiter = RateLimiter(int(rate_limit) if rate_limit else None)
+        self.retry = RetryPolicy(max_attempts=int(config.get('max_attempts', MAX_ATTEMPTS)),
+                                 backoff=float(config.get('retry_backoff', DEFAULT_RETRY_BACKOFF)),
+                                 retry_post=_parse_flag(config.get('retry_post', False)))
+        self.cache = ResponseCache(config) if cache else None
+        self.engine = engine
+        self.async_client = None
+
+        if engine == 'async':
+            from .async_client import AsyncClient
+
+            self.async_client = AsyncClient(config, self.limiter, self.retry)
+
+        self.auth = (config['email'], config['password'])
+        self.session = requests.Session()
+        self.session.headers.update({'Connection': 'keep-alive'})
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, cache=True, external=False, **kwargs):
+        """
+        Send a request through the pooled session, waiting on the rate
+        limiter first. Requests that fail with a 429, a 502-504 or a
+        connection error are sent again as the retry policy allows.
+        :param method: the HTTP method
+        :param url: the url to request
+        :param cache: flag to allow answering a GET from the response cache, if enabled
+        :param external: flag for a url outside the Zendesk API (e.g. a theme storage url), which is sent without
+            Zendesk credentials and without waiting on the Zendesk rate limiter
+        :return: the response
+        """
+        if method == 'GET' and cache and self.cache:
+            return self.cache.request(lambda cache_url, **cache_kwargs: self._send('GET', cache_url, **cache_kwargs),
+                                      url, **kwargs)
+
+        return self._send(method, url, external=external, **kwargs)
+
+    def _send(self, method, url, external=False, **kwargs):
+        import requests
+
+        metrics = get_metrics()
+        attempt = 0
+        url, headers = route_url(url, self.base_url)
+        file_positions = _get_file_positions(kwargs.get('files'))
+        # Without a timeout, a stalled connection would hang the command for good.
+        kwargs.setdefault('timeout', self.timeout)
+
+        if headers:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **headers}
+
+        while True:
+            start = time.perf_counter()
+
+            if not external:
+                self.limiter.acquire()
+
+                if metrics:
+                    metrics.record_wait('rate limit', start, time.perf_counter() - start)
+                    start = time.perf_counter()
+
+            for f, position in file_positions or []:
+                f.seek(position)
+
+            try:
+                r = self.session.request(method, url, auth=None if external else self.auth, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+                if metrics:
+                    metrics.record_request(method, url, type(err).__name__, start, time.perf_counter() - start, 0)
+
+                if file_positions is None or not self.retry.should_retry(method, attempt, error=err):
+                    raise click.ClickException(err)
+
+                delay = self.retry.get_delay(attempt, type(err).__name__)
+            else:
+                if metrics:
+                    metrics.record_request(method, r.url, r.status_code, start, time.perf_counter() - start,
+                                           len(r.content))
+
+                if not external:
+                    self.limiter.update(r.status_code, r.headers)
+
+                if file_positions is None or not self.retry.should_retry(method, attempt, status_code=r.status_code):
+                    return r
+
+                delay = self.retry.get_delay(attempt, r.status_code, r.headers)
+
+            if metrics:
+                metrics.record_wait('retry', time.perf_counter(), delay)
+
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        report = self.retry.report()
+
+        if report:
+            click.echo(f"{self.subdomain}: {report}", err=True)
+
+        if self.cache:
+            self.cache.save_stats()
+
+        if self.async_client:
+            self.async_client.close()
+
+        self.session.close()
+
+
+def get_client(config):
+    """
+    Get the shared client for the given config, creating it on first use.
+    :param config: context config
+    :return: the client
+    """
+    key = (config.get('subdomain'), config.get('email'))
+
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = Client(config, **_client_options)
+
+        return _clients[key]
+
+
+def set_client_options(**options):
+    """
+    Set options for every client created from now on.
+    :param options: keyword arguments for Client, e.g. cache=True
+    """
+    _client_options.update(options)
+
+
+def close_clients():
+    """
+    Close every client created during this invocation.
+    """
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+
+        _clients.clear()
@@ -33,4 +33,4 @@ def add_macros(ctx, directory, filename):
 
     click.confirm('Are you sure you want to add %d macros?' % len(data['macros']), abort=True)
 
-    post_all_macros(config=ctx.obj['configuration'], data=data['macros'])
+    post_all_macros(config=ctx.obj['configuration'], data=data['macros'], concurrency=ctx.obj['concurrency'])
@@ -1,8 +1,153 @@
 import os
-from time import time
+import time
+from contextlib import nullcontext
 from pathlib import Path
 import click
-from ..utilities import get_all_hc_by_type, write_json, write_csv, archive_directory, push_archive_to_remote
+from ..constants import STORE_DIRNAME
+from ..archive import ArchiveWriter
+from ..backup_store import write_objects, write_manifest, read_manifest, read_objects
+from ..utilities import (get_all_hc_by_type, get_hc_changes_since, get_all_brands, push_paths_to_remote,
+                         read_backup_state, write_backup_state, read_archived_json, get_output_directory,
+                         confirm_or_create_path, map_concurrently)
+
+GUIDE_TYPES = ('articles', 'sections', 'categories')
+# Restricted help centers are only visible to signed-in users, but still hold content worth backing up.
+BACKED_UP_HC_STATES = {'enabled', 'restricted'}
+
+
+def merge_changes(previous, changes, counts):
+    """
+    Merge changed items into the items of a previous backup. Changed items
+    replace their previous version in place; new items are added at the end.
+    :param previous: the items of the previous backup
+    :param changes: the changed items
+    :param counts: dict to record the number of changed and unchanged items in
+    :return: generator of the merged items
+    """
+    merged = {item['id']: item for item in previous}
+    changed = set()
+
+    for item in changes:
+        merged[item['id']] = item
+        changed.add(item['id'])
+
+    counts['changed'] = len(changed)
+    counts['unchanged'] = len(merged) - len(changed)
+
+    yield from merged.values()
+
+
+def count_items(items, counts, key):
+    """
+    Count items as they pass through.
+    :param items: the items
+    :param counts: dict to record the count in
+    :param key: the key to record the count under
+    :return: generator of the items
+    """
+    counts[key] = 0
+
+    for item in items:
+        counts[key] += 1
+        yield item
+
+
+def read_previous_backup(directory, previous, guide_type):
+    """
+    Read the items of one type from the backup recorded in the backup state.
+    :param directory: the backup directory
+    :param previous: the backup state of the help center
+    :param guide_type: the item type (articles, sections, categories)
+    :return: iterable of items
+    """
+    if 'manifest' in previous:
+        store_path = os.path.join(directory, STORE_DIRNAME)
+        manifest = read_manifest(store_path, previous['manifest'])
+
+        return read_objects(store_path, manifest[guide_type])
+
+    return read_archived_json(os.path.join(directory, previous['archive']), '%s.json' % guide_type)
+
+
+def get_help_center_subdomains(config):
+    """
+    Get the subdomains of every brand with a help center to back up.
+    :param config: context config
+    :return list: brand subdomains
+    """
+    return [brand['subdomain'] for brand in get_all_brands(config)
+            if brand.get('has_help_center', True) and brand.get('help_center_state') in BACKED_UP_HC_STATES]
+
+
+def backup_help_center(config, subdomain, directory, backup_time, format, incremental, store, concurrency,
+                       compression_level=None):
+    """
+    Backup the articles, sections and categories of one help center, fetching
+    the three types at once.
+    :param config: context config
+    :param subdomain: the brand subdomain of the help center
+    :param directory: the directory to keep the backups, state and store of this help center in
+    :param backup_time: unix timestamp of the backup
+    :param format: the export format (json, csv)
+    :param incremental: flag to only get items changed since the last backup
+    :param store: flag to save items in the content-addressed store
+    :param concurrency: max pages fetched at once per type
+    :param compression_level: deflate level of the archive
+    :return tuple: the paths written, and the item counts per type
+    """
+    state = read_backup_state(directory)
+    previous = state.get(subdomain)
+
+    if incremental and previous is None:
+        click.echo(f"No previous backup of {subdomain} found. Making a full backup.")
+
+    store_path = os.path.join(directory, STORE_DIRNAME)
+    manifest = {'backup_time': backup_time, 'subdomain': subdomain}
+    written = []
+    report = {t: {} for t in GUIDE_TYPES}
+
+    def backup_type(t):
+        if incremental and previous:
+            changes = get_hc_changes_since(config=config, guide_type=t, start_time=previous['start_time'],
+                                           concurrency=concurrency, subdomain=subdomain)
+            data = merge_changes(read_previous_backup(directory, previous, t), changes, report[t])
+        else:
+            data = get_all_hc_by_type(config=config, guide_type=t, concurrency=concurrency, subdomain=subdomain)
+
+        data = count_items(data, report[t], 'total')
+
+        if store:
+            click.echo(f"Storing {t} in {click.format_filename(store_path)}")
+            manifest[t], written_objects = write_objects(store_path, data)
+            written.extend(written_objects)
+            click.echo(f"{subdomain} {t}: {len(written_objects)} new objects, "
+                       f"{len(manifest[t]) - len(written_objects)} already stored")
+        else:
+            archive.write('%s.%s' % (t, format), data)
+
+    archive_path = os.path.join(directory, 'backup_%s.zip' % backup_time)
+
+    # The archive is discarded if any type fails, so a backup is never left half written.
+    with nullcontext() if store else ArchiveWriter(archive_path, compression_level) as archive:
+        try:
+            for _ in map_concurrently(backup_type, GUIDE_TYPES, concurrency=len(GUIDE_TYPES)):
+                pass
+        except ValueError as err:
+            raise click.ClickException(err)
+
+    if store:
+        written.append(write_manifest(store_path, manifest))
+        state[subdomain] = {'start_time': backup_time, 'manifest': backup_time}
+    else:
+        written.append(archive_path)
+
+        if format == 'json':
+            state[subdomain] = {'start_time': backup_time, 'archive': os.path.basename(archive_path)}
+
+    if format == 'json':
+        write_backup_state(directory, state)
+
+    return written, report
 
 
 @click.command()
@@ -11,35 +156,66 @@ from ..utilities import get_all_hc_by_type, write_json, write_csv, archive_direc
 @click.option('--backup-remotely', is_flag=True)
 @click.option('--remote-name', type=click.STRING, default='origin')
 @click.option('--format', type=click.Choice(['json', 'csv'], case_sensitive=False), default='json')
+@click.option('--incremental', is_flag=True, help='Only get items changed since the last backup in DIRECTORY.')
+@click.option('--store', is_flag=True,
+              help='Save items as deduplicated objects plus a manifest instead of a zip archive.')
+@click.option('--compression-level', type=click.IntRange(0, 9),
+              help='Compression level of the backup archive, from 0 (fastest) to 9 (smallest).')
+@click.option('--all-brands', is_flag=True,
+              help='Backup the help center of every brand, each in its own subdirectory of DIRECTORY.')
 @click.pass_context
-def backup_guide(ctx, directory, backup_remotely, remote_name, format):
+def backup_guide(ctx, directory, backup_remotely, remote_name, format, incremental, store, compression_level,
+                 all_brands):
     """Backup Guide categories, sections and articles."""
     if ctx.obj['configuration'] == {}:
         raise click.UsageError('No configuration found. Try `zenkly configure`', ctx=ctx)
 
-    backup_time = int(time())
+    if incremental and format != 'json':
+        raise click.UsageError('Incremental backups are only supported in json format.', ctx=ctx)
 
-    for t in ['articles', 'sections', 'categories']:
-        try:
-            data = get_all_hc_by_type(config=ctx.obj['configuration'], guide_type=t)
-        except ValueError as err:
-            raise click.ClickException(err)
+    if store and format != 'json':
+        raise click.UsageError('The store keeps items as JSON. Use `zenkly restore-guide --format csv` to export '
+                               'a stored backup as CSV.', ctx=ctx)
 
-        output_path = os.path.join(directory, 'backup_%s' % backup_time)
+    config = ctx.obj['configuration']
+    backup_time = int(time.time())
+    repo_dir = directory
+    directory = get_output_directory(ctx, directory)
 
-        if format == 'json':
-            filename = '%s.json' % t
-            write_json(output_path=output_path, filename=filename, data=data)
-        elif format == 'csv':
-            filename = '%s.csv' % t
-            write_csv(output_path=output_path, filename=filename, data=data)
-        else:
-            raise click.UsageError('Unknown export format.', ctx=ctx)
+    if all_brands:
+        subdomains = get_help_center_subdomains(config)
+        click.echo(f"Backing up {len(subdomains)} help centers: {', '.join(subdomains)}")
+    else:
+        subdomains = [config['subdomain']]
+
+    def backup(subdomain):
+        start = time.perf_counter()
+        hc_directory = os.path.join(directory, subdomain) if all_brands else directory
+        confirm_or_create_path(hc_directory)
+
+        written, report = backup_help_center(config, subdomain, hc_directory, backup_time, format, incremental,
+                                             store, ctx.obj['concurrency'], compression_level)
+
+        return subdomain, written, report, time.perf_counter() - start
+
+    # Every brand belongs to the same account, so they all share its connection pool and rate limit.
+    results = list(map_concurrently(backup, subdomains, concurrency=max(1, len(subdomains))))
+
+    from tabulate import tabulate
+
+    click.echo()
+    click.echo(tabulate([[subdomain] + [report[t]['total'] for t in GUIDE_TYPES] + [f"{duration:.1f}s"]
+                         for subdomain, _, report, duration in results],
+                        headers=['Help center', *GUIDE_TYPES, 'Time']))
 
-    archive_path = archive_directory(output_path)
+    for subdomain, _, report, _ in results:
+        for t in GUIDE_TYPES:
+            if 'changed' in report[t]:
+                click.echo(f"{subdomain} {t}: {report[t]['changed']} changed, {report[t]['unchanged']} unchanged")
 
     if backup_remotely:
-        push_archive_to_remote(repo_dir=directory, remote_name=remote_name, archive_path=archive_path,
-                               backup_time=backup_time)
+        push_paths_to_remote(repo_dir=repo_dir, remote_name=remote_name,
+                             paths=[path for _, written, _, _ in results for path in written],
+                             backup_time=backup_time)
 
     click.secho('Done!', fg='green')
@@ -0,0 +1,42 @@
+import os
+import click
+from ..cache import get_cache_dir, read_cache_stats, list_cache_entries, STATS_FILENAME
+
+
+@click.group()
+def cache():
+    """Inspect or clear the response cache."""
+
+
+@cache.command()
+def stats():
+    """Show response cache hit rates and size."""
+    cache_dir = get_cache_dir()
+    totals = read_cache_stats(cache_dir)
+    entries = list_cache_entries(cache_dir)
+
+    requests_seen = totals['hits'] + totals['revalidated'] + totals['misses']
+    hit_rate = (totals['hits'] + totals['revalidated']) / requests_seen if requests_seen else 0
+
+    click.echo(f"Cache directory: {click.format_filename(cache_dir)}")
+    click.echo(f"Entries: {len(entries)} ({sum(size for _, size, _ in entries) / 1024 / 1024:.1f} MB)")
+    click.echo(f"Hits: {totals['hits']}")
+    click.echo(f"Revalidated (304): {totals['revalidated']}")
+    click.echo(f"Misses: {totals['misses']}")
+    click.echo(f"Hit rate: {hit_rate:.1%}")
+    click.echo(f"Bytes saved: {totals['bytes_saved']}")
+
+
+@cache.command()
+def clear():
+    """Delete every cached response and reset the statistics."""
+    cache_dir = get_cache_dir()
+    entries = list_cache_entries(cache_dir)
+
+    for path, _, _ in entries:
+        os.remove(path)
+
+    if os.path.exists(os.path.join(cache_dir, STATS_FILENAME)):
+        os.remove(os.path.join(cache_dir, STATS_FILENAME))
+
+    click.echo(f"Removed {len(entries)} cached responses.")
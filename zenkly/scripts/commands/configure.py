@@ -9,8 +9,9 @@ from ..constants import APP_NAME
 @click.option('--subdomain', type=click.STRING, prompt=True)
 @click.option('--email', type=click.STRING, prompt=True)
 @click.option('--password', type=click.STRING, prompt=True, hide_input=True)
+@click.option('--rate-limit', type=click.IntRange(min=1), help='Max requests per minute for this profile.')
 @click.pass_context
-def configure(ctx, subdomain, email, password):
+def configure(ctx, subdomain, email, password, rate_limit):
     """Configure Zendesk authentication."""
     profile = ctx.obj['profile']
 
@@ -27,6 +28,9 @@ def configure(ctx, subdomain, email, password):
     config.set(profile, 'Email', email)
     config.set(profile, 'Password', password)
 
+    if rate_limit:
+        config.set(profile, 'Rate_Limit', str(rate_limit))
+
     try:
         os.makedirs(click.get_app_dir(APP_NAME))
     except OSError as e:
@@ -1,39 +1,152 @@
 import os
 from time import time
+from collections import defaultdict, Counter
 import json
 import shutil
 import click
 from zenkly.scripts.utilities import write_json
 
 
+def get_title(item):
+    # Sections and categories are named, articles are titled.
+    return item['name'] if 'name' in item else item['title']
+
+
+def normalize_title(title):
+    return ' '.join(title.casefold().split())
+
+
+def trigrams(title):
+    padded = f"  {title} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_title_index(items):
+    """
+    Index items by normalized title.
+    :param items: backup items
+    :return dict: normalized title -> list of ids
+    """
+    index = defaultdict(list)
+
+    for item in items:
+        index[normalize_title(get_title(item))].append(item['id'])
+
+    return index
+
+
+def build_trigram_index(titles):
+    """
+    Index titles by their character trigrams.
+    :param titles: dict of id -> normalized title
+    :return tuple: trigram -> list of ids, and id -> trigram count
+    """
+    index = defaultdict(list)
+    sizes = {}
+
+    for item_id, title in titles.items():
+        grams = trigrams(title)
+        sizes[item_id] = len(grams)
+
+        for gram in grams:
+            index[gram].append(item_id)
+
+    return index, sizes
+
+
+def find_fuzzy_matches(title, trigram_index, sizes, threshold):
+    """
+    Find the most similar indexed titles by trigram Jaccard similarity.
+    :param title: normalized title to match
+    :param trigram_index: trigram -> list of ids
+    :param sizes: id -> trigram count
+    :param threshold: minimum similarity, from 0 to 1
+    :return tuple: the best score and the ids that have it
+    """
+    grams = trigrams(title)
+    shared = Counter(item_id for gram in grams for item_id in trigram_index.get(gram, ()))
+
+    best_score = 0
+    best_ids = []
+
+    for item_id, count in shared.items():
+        score = count / (len(grams) + sizes[item_id] - count)
+
+        if score > best_score:
+            best_score, best_ids = score, [item_id]
+        elif score == best_score:
+            best_ids.append(item_id)
+
+    if best_score < threshold:
+        return best_score, []
+
+    return best_score, best_ids
+
+
 @click.command()
 @click.option('--old-backup-file', type=click.File(), required=True)
 @click.option('--new-backup-file', type=click.File(), required=True)
 @click.option('--directory', type=click.Path(exists=True, file_okay=False, writable=True, resolve_path=True),
               default='.')
+@click.option('--fuzzy', is_flag=True, help='Match remaining items by title similarity.')
+@click.option('--threshold', type=click.FloatRange(0, 1), default=0.8, show_default=True,
+              help='Minimum title similarity for fuzzy matches.')
 @click.pass_context
-def create_article_mapping(ctx, directory, old_backup_file, new_backup_file):
+def create_article_mapping(ctx, directory, old_backup_file, new_backup_file, fuzzy, threshold):
     """Generate a JSON object with mapping based on provided backup files."""
     mapping_time = int(time())
 
     mapping = {}
+    report = {'exact': 0, 'fuzzy': [], 'ambiguous': [], 'unmatched': []}
 
     old_data = json.load(old_backup_file)
     new_data = json.load(new_backup_file)
 
+    title_index = build_title_index(new_data)
+    matched_ids = set()
+    unmatched = {}
+
     for o in old_data:
         old_id = o['id']
-        old_title = o['name']
+        new_ids = title_index.get(normalize_title(get_title(o)))
 
-        for n in new_data:
-            new_id = n['id']
-            new_title = n['name']
+        if not new_ids:
+            unmatched[old_id] = normalize_title(get_title(o))
+            continue
 
-            if old_title == new_title:
-                mapping[old_id] = str(new_id)
+        mapping[old_id] = str(new_ids[-1])
+        matched_ids.add(new_ids[-1])
+        report['exact'] += 1
+
+        if len(new_ids) > 1:
+            report['ambiguous'].append({'id': old_id, 'title': get_title(o), 'candidates': new_ids})
+
+    if fuzzy and unmatched:
+        candidates = {n['id']: normalize_title(get_title(n)) for n in new_data if n['id'] not in matched_ids}
+        trigram_index, sizes = build_trigram_index(candidates)
+
+        with click.progressbar(list(unmatched.items()), label='Fuzzy matching...') as bar:
+            for old_id, title in bar:
+                score, new_ids = find_fuzzy_matches(title, trigram_index, sizes, threshold)
+
+                if len(new_ids) == 1:
+                    mapping[old_id] = str(new_ids[0])
+                    report['fuzzy'].append({'id': old_id, 'new_id': new_ids[0], 'score': round(score, 3)})
+                    del unmatched[old_id]
+                elif new_ids:
+                    report['ambiguous'].append({'id': old_id, 'title': title, 'candidates': new_ids})
+                    del unmatched[old_id]
+
+    report['unmatched'] = [{'id': old_id, 'title': title} for old_id, title in unmatched.items()]
 
     filename = 'mapping_%s.json' % mapping_time
 
     write_json(output_path=directory, filename=filename, data=mapping)
 
+    click.echo(f"Matched {report['exact']} by title and {len(report['fuzzy'])} by similarity. "
+               f"{len(report['ambiguous'])} ambiguous, {len(report['unmatched'])} unmatched.")
+
+    if report['fuzzy'] or report['ambiguous'] or report['unmatched']:
+        write_json(output_path=directory, filename='mapping_%s_report.json' % mapping_time, data=report)
+
     click.secho('Done!', fg='green')
@@ -0,0 +1,51 @@
+import os
+from pathlib import Path
+import click
+from ..search_index import get_index_path, open_index, get_indexed_backup_time, list_backups, update_index
+
+
+@click.group()
+def index():
+    """Build a local search index of Guide backups."""
+
+
+@index.command()
+@click.option('--directory', type=click.Path(exists=True, file_okay=False, resolve_path=True),
+              default=str(Path.home()), help='The directory backup-guide was run with.')
+@click.option('--snapshot', type=click.INT, help='Backup time of the backup to index. Defaults to the latest.')
+@click.option('--index', 'index_path', type=click.Path(dir_okay=False, resolve_path=True),
+              help='Path of the index. Defaults to guide_index.sqlite in DIRECTORY.')
+@click.option('--rebuild', is_flag=True, help='Index the backup from scratch instead of updating the index.')
+def build(directory, snapshot, index_path, rebuild):
+    """Index the articles of a Guide backup, in every language, for `zenkly search`."""
+    backups = list_backups(directory)
+
+    if not backups:
+        raise click.UsageError(f"No backups found in {click.format_filename(directory)}")
+
+    if snapshot is None:
+        snapshot = max(backups)
+    elif snapshot not in backups:
+        raise click.BadParameter(f"No backup with backup time {snapshot}", param_hint='--snapshot')
+
+    index_path = get_index_path(directory, index_path)
+
+    if rebuild and os.path.exists(index_path):
+        os.remove(index_path)
+
+    connection = open_index(index_path)
+
+    try:
+        indexed = get_indexed_backup_time(connection)
+
+        if indexed == snapshot:
+            click.echo(f"The index is already up to date with backup {snapshot}.")
+            return
+
+        click.echo(f"Indexing backup {snapshot} into {click.format_filename(index_path)}")
+        counts = update_index(connection, directory, snapshot, backups[snapshot])
+    finally:
+        connection.close()
+
+    click.echo(', '.join(f"{count} {change}" for change, count in counts.items()))
+    click.secho('Done!', fg='green')
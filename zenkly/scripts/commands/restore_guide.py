@@ -0,0 +1,41 @@
+import os
+from pathlib import Path
+import click
+from ..constants import STORE_DIRNAME
+from ..archive import ArchiveWriter
+from ..backup_store import list_manifests, read_manifest, read_objects
+
+
+@click.command()
+@click.option('--store-directory', type=click.Path(exists=True, file_okay=False, resolve_path=True),
+              default=str(Path.home()), help='The directory backup-guide --store was run with.')
+@click.option('--snapshot', type=click.INT, help='Backup time of the snapshot to restore. Defaults to the latest.')
+@click.option('--directory', type=click.Path(exists=True, file_okay=False, writable=True, resolve_path=True),
+              default='.')
+@click.option('--format', type=click.Choice(['json', 'csv'], case_sensitive=False), default='json')
+@click.option('--list', 'list_snapshots', is_flag=True, help='List the stored snapshots and exit.')
+def restore_guide(store_directory, snapshot, directory, format, list_snapshots):
+    """Rebuild a Guide backup archive from the backup store."""
+    store_path = os.path.join(store_directory, STORE_DIRNAME)
+    snapshots = list_manifests(store_path)
+
+    if not snapshots:
+        raise click.UsageError(f"No stored backups found in {click.format_filename(store_path)}")
+
+    if list_snapshots:
+        for backup_time in snapshots:
+            click.echo(backup_time)
+        return
+
+    if snapshot is None:
+        snapshot = snapshots[-1]
+    elif snapshot not in snapshots:
+        raise click.BadParameter(f"No snapshot with backup time {snapshot}", param_hint='--snapshot')
+
+    manifest = read_manifest(store_path, snapshot)
+
+    with ArchiveWriter(os.path.join(directory, 'backup_%s.zip' % snapshot)) as archive:
+        for t in ['articles', 'sections', 'categories']:
+            archive.write('%s.%s' % (t, format), read_objects(store_path, manifest[t]))
+
+    click.secho('Done!', fg='green')
@@ -0,0 +1,76 @@
+import click
+from ..utilities import (get_all_macros, get_all_triggers, get_all_automations, get_all_views, get_output_directory,
+                         map_concurrently)
+from ..export import get_export_path
+from ..rule_graph import GRAPH_FORMATS, RuleIndex, parse_reference
+
+RULE_GETTERS = {
+    'trigger': get_all_triggers,
+    'automation': get_all_automations,
+    'macro': get_all_macros,
+    'view': get_all_views,
+}
+
+
+@click.command()
+@click.argument('references', nargs=-1)
+@click.option('--active_only', is_flag=True)
+@click.option('--graph', 'graph_format', type=click.Choice(GRAPH_FORMATS, case_sensitive=False),
+              help='Also save the graph of every rule and the fields and values it references.')
+@click.option('--directory', type=click.Path(exists=True, file_okay=False, writable=True, resolve_path=True),
+              default='.')
+@click.option('--filename', type=click.STRING, default='rule_graph')
+@click.option('--limit', type=click.IntRange(min=1), default=20, show_default=True,
+              help='Number of fields to list when no REFERENCES are given.')
+@click.pass_context
+def rule_references(ctx, references, active_only, graph_format, directory, filename, limit):
+    """
+    Find the business rules that reference a field or value.
+
+    Gets every trigger, automation, macro and view, and shows the ones
+    using each of REFERENCES in their conditions, actions or (for views)
+    columns. A reference is a field, e.g. `custom_fields_123`, or a field
+    and value, e.g. `group_id=456`. Without REFERENCES, shows the most
+    referenced fields.
+    """
+    if ctx.obj['configuration'] == {}:
+        raise click.UsageError('No configuration found. Try `zenkly configure`', ctx=ctx)
+
+    from tabulate import tabulate
+
+    config = ctx.obj['configuration']
+    index = RuleIndex()
+
+    def index_rules(kind):
+        index.add_rules(kind, RULE_GETTERS[kind](config=config, active_only=active_only,
+                                                 concurrency=ctx.obj['concurrency']))
+
+    for _ in map_concurrently(index_rules, RULE_GETTERS, concurrency=len(RULE_GETTERS)):
+        pass
+
+    click.echo(f"Indexed {len(index.titles)} rules.")
+
+    for reference in references:
+        field, value = parse_reference(reference)
+        found = index.find(field, value)
+
+        click.echo()
+        click.secho(f"{reference}: {len({(kind, rule_id) for kind, rule_id, *_ in found})} rules", bold=True)
+
+        if found:
+            click.echo(tabulate(found, headers=['Kind', 'ID', 'Title', 'Used in', 'Operator', 'Value']))
+
+    if not references:
+        click.echo()
+        click.echo(tabulate(index.count_rules_by_field()[:limit], headers=['Field', 'Rules']))
+
+    if graph_format:
+        path = get_export_path(get_output_directory(ctx, directory), filename, graph_format)
+
+        with open(path, 'w') as f:
+            if graph_format == 'dot':
+                index.write_dot(f)
+            else:
+                index.write_json(f)
+
+        click.echo(f"Rule graph saved to {path}")
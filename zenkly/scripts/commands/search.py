@@ -0,0 +1,44 @@
+import os
+from pathlib import Path
+import click
+from ..search_index import get_index_path, open_index, search_index
+
+
+@click.command()
+@click.argument('query')
+@click.option('--directory', type=click.Path(exists=True, file_okay=False, resolve_path=True),
+              default=str(Path.home()), help='The directory the index was built in.')
+@click.option('--index', 'index_path', type=click.Path(dir_okay=False, resolve_path=True),
+              help='Path of the index. Defaults to guide_index.sqlite in DIRECTORY.')
+@click.option('--locale', type=click.STRING, help='Only show articles in this locale, e.g. en-us.')
+@click.option('--label', type=click.STRING, help='Only show articles with this label.')
+@click.option('--limit', type=click.IntRange(min=1), default=20, show_default=True)
+def search(query, directory, index_path, locale, label, limit):
+    """
+    Search the article translations indexed by `zenkly index build`.
+
+    QUERY is an SQLite full-text query over the title, body, labels,
+    locale, section and category of every article, e.g. `refund`,
+    `"gift card"`, `refund*` or `title:refund AND labels:billing`.
+    """
+    index_path = get_index_path(directory, index_path)
+
+    if not os.path.exists(index_path):
+        raise click.UsageError(f"No index found at {click.format_filename(index_path)}. "
+                               f"Try `zenkly index build`")
+
+    connection = open_index(index_path)
+
+    try:
+        results = search_index(connection, query, locale=locale, label=label, limit=limit)
+    finally:
+        connection.close()
+
+    if not results:
+        click.echo('No articles found.')
+        return
+
+    for article_id, title, section, article_locale, html_url, snippet in results:
+        click.secho(f"{article_id}  {title}", bold=True)
+        click.echo(f"    {section or '-'} ({article_locale})  {html_url or ''}".rstrip())
+        click.echo(f"    {snippet}")
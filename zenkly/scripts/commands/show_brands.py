@@ -1,5 +1,4 @@
 import click
-from tabulate import tabulate
 from ..utilities import get_all_brands
 
 
@@ -10,6 +9,8 @@ def show_brands(ctx):
     if ctx.obj['configuration'] == {}:
         raise click.UsageError('No configuration found. Try `zenkly configure`', ctx=ctx)
 
+    from tabulate import tabulate
+
     brands = get_all_brands(config=ctx.obj['configuration'])
 
     headers = ['Name', 'ID', 'Subdomain', 'Brand URL', 'HC State', 'Active?', 'Host Mapping']
@@ -1,21 +1,11 @@
 import os
 import click
 import simplejson as json
-from ..utilities import put_all_macros
+from ..constants import MACRO_ENTRIES
+from ..utilities import put_all_macros, get_all_macros, diff_macros
 
 
-@click.command()
-@click.option('--directory', type=click.Path(exists=True, file_okay=False, writable=True, resolve_path=True),
-              default='.', prompt=True)
-@click.option('--filename', type=click.STRING, default='macros_edited.json', prompt=True)
-@click.pass_context
-def update_macros(ctx, directory, filename):
-    """Update all macros from file."""
-    if ctx.obj['configuration'] == {}:
-        raise click.UsageError('No configuration found. Try `zenkly configure`', ctx=ctx)
-
-    path = '%s/%s' % (directory, filename)
-
+def load_macros(path):
     if not os.path.exists(path):
         raise click.FileError(path, hint='File does not exist')
 
@@ -31,6 +21,62 @@ def update_macros(ctx, directory, filename):
     if not type(data['macros']) is list:
         raise click.UsageError('Key `macros` in %s must be a list' % path)
 
-    click.confirm('Are you sure you want to update %d macros?' % len(data['macros']), abort=True)
+    return data['macros']
+
+
+@click.command()
+@click.option('--directory', type=click.Path(exists=True, file_okay=False, writable=True, resolve_path=True),
+              default='.', prompt=True)
+@click.option('--filename', type=click.STRING, default='macros_edited.json', prompt=True)
+@click.option('--bulk', is_flag=True, help='Batch updates Zendesk can apply in bulk into update_many requests.')
+@click.option('--only-changed', is_flag=True, help='Only send the fields that differ from the current macros.')
+@click.option('--snapshot', type=click.Path(exists=True, dir_okay=False, resolve_path=True),
+              help='Compare against this get-macros export instead of fetching the current macros.')
+@click.option('--dry-run', is_flag=True, help='Show what would change without updating anything.')
+@click.pass_context
+def update_macros(ctx, directory, filename, bulk, only_changed, snapshot, dry_run):
+    """Update all macros from file."""
+    if ctx.obj['configuration'] == {}:
+        raise click.UsageError('No configuration found. Try `zenkly configure`', ctx=ctx)
+
+    if (snapshot or dry_run) and not only_changed:
+        raise click.UsageError('--snapshot and --dry-run require --only-changed', ctx=ctx)
+
+    path = '%s/%s' % (directory, filename)
+    macros = load_macros(path)
+
+    if only_changed:
+        if snapshot:
+            current = load_macros(snapshot)
+        else:
+            current = get_all_macros(config=ctx.obj['configuration'], concurrency=ctx.obj['concurrency'])
+
+        edited_ids = {m['id'] for m in macros}
+        current = [{k: m[k] for k in m if k == 'id' or k in MACRO_ENTRIES} for m in current if m['id'] in edited_ids]
+        titles = {m['id']: m.get('title') for m in macros}
+
+        changes, missing = diff_macros(current, macros)
+
+        click.secho(f"\n{len(changes)} of {len(macros)} macros changed", bold=True)
+        for change in changes:
+            fields = ', '.join(k for k in change if k != 'id')
+            click.echo(f"{change['id']} {titles[change['id']]}: {fields}")
+
+        if missing:
+            click.secho(f"\n{len(missing)} macros not found in the current macros (will be sent whole):", bold=True)
+            for m in missing:
+                click.echo(f"{m['id']} {m.get('title')}")
+
+        if dry_run:
+            return
+
+        macros = changes + missing
+
+        if not macros:
+            click.secho('Nothing to update.', fg='green')
+            return
+
+    click.confirm('Are you sure you want to update %d macros?' % len(macros), abort=True)
 
-    put_all_macros(config=ctx.obj['configuration'], data=data['macros'])
+    put_all_macros(config=ctx.obj['configuration'], data=macros, bulk=bulk,
+                   concurrency=ctx.obj['concurrency'])
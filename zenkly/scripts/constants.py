@@ -1,2 +1,11 @@
 APP_NAME = 'zenkly'
-VALID_HC_TYPES = {'articles', 'categories', 'sections'}
\ No newline at end of file
+VALID_HC_TYPES = {'articles', 'categories', 'sections'}
+PAGE_SIZE = 100
+# Zendesk only serves this many pages of a list with offset pagination.
+MAX_OFFSET_PAGES = 100
+BULK_SIZE = 100
+MAX_ATTEMPTS = 5
+BACKUP_STATE_FILENAME = '.zenkly_backup_state.json'
+STORE_DIRNAME = 'guide_store'
+MACRO_ENTRIES = ('title', 'active', 'actions', 'restriction', 'description', 'attachments')
+BULK_MACRO_ENTRIES = {'active'}
\ No newline at end of file
@@ -0,0 +1,172 @@
+import io
+import os
+import gzip
+import json
+import itertools
+import click
+from .utilities import write_json_stream, write_csv_stream, write_ndjson_stream, order_columns, spill_rows
+
+EXPORT_FORMATS = ('json', 'ndjson', 'csv', 'parquet')
+COMPRESSIONS = {'gzip': 'gz', 'zstd': 'zst'}
+PARQUET_BATCH_SIZE = 1000
+
+
+def get_export_path(directory, filename, format, compression=None):
+    """
+    Get the path of an export file, e.g. triggers.ndjson.gz.
+    :param directory: the output directory
+    :param filename: the filename without extension
+    :param format: the export format
+    :param compression: the compression (gzip, zstd), if any
+    :return: the path
+    """
+    path = '%s/%s.%s' % (directory, filename, format)
+
+    if compression:
+        path = '%s.%s' % (path, COMPRESSIONS[compression])
+
+    return path
+
+
+def open_export_file(path, compression=None):
+    """
+    Open a text file for writing, compressing it on the fly.
+    :param path: the file path
+    :param compression: the compression (gzip, zstd), if any
+    :return: file open for writing text
+    """
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8')
+
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise click.UsageError('zstd compression needs zstandard. Install it with `pip install zenkly[zstd]`.')
+
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(path, 'wb')), encoding='utf-8')
+
+    return open(path, 'w')
+
+
+def export_records(path, records, format, key, format_for_csv, compression=None):
+    """
+    Write records to an export file. The file is written under a temporary
+    name and only replaces an existing export once every record is
+    written, so a listing that fails partway leaves the previous export as
+    it was instead of a truncated one.
+    :param path: the file path
+    :param records: iterable of records
+    :param format: the export format (json, ndjson, csv, parquet)
+    :param key: the key to wrap the JSON array in
+    :param format_for_csv: function flattening a record into a CSV/Parquet row
+    :param compression: the compression (gzip, zstd) of a text format, if any
+    """
+    if format == 'parquet' and compression:
+        raise click.UsageError('Parquet files are compressed internally and cannot be compressed again.')
+
+    partial_path = f"{path}.partial"
+
+    try:
+        if format == 'parquet':
+            write_parquet(partial_path, (format_for_csv(record) for record in records))
+        else:
+            with open_export_file(partial_path, compression) as outfile:
+                if format == 'csv':
+                    write_csv_stream(outfile, (format_for_csv(record) for record in records))
+                elif format == 'ndjson':
+                    write_ndjson_stream(outfile, records)
+                else:
+                    write_json_stream(outfile, records, key=key, indent=2)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    os.replace(partial_path, path)
+
+
+def get_column_type(kinds):
+    """
+    Choose the Arrow type of a column from the Python types of its values.
+    Columns mixing types are stored as JSON-encoded strings.
+    :param kinds: set of the type names of the non-null values
+    :return: the Arrow type
+    """
+    import pyarrow
+
+    if kinds == {'list'}:
+        return pyarrow.list_(pyarrow.string())
+
+    if kinds == {'bool'}:
+        return pyarrow.bool_()
+
+    if kinds == {'int'}:
+        return pyarrow.int64()
+
+    if kinds <= {'int', 'float'} and kinds:
+        return pyarrow.float64()
+
+    return pyarrow.string()
+
+
+def to_strings(values):
+    return [value if value is None or isinstance(value, str) else json.dumps(value) for value in values]
+
+
+def to_string_lists(values):
+    return [None if value is None else [v if isinstance(v, str) else json.dumps(v) for v in value] for value in values]
+
+
+def get_column_converter(column_type, kinds):
+    """
+    Choose, once per column, how the values of a column are converted to
+    its Arrow type, so a batch is converted column by column instead of
+    checking the type of the column again for every value.
+    :param column_type: the Arrow type of the column
+    :param kinds: set of the type names of the non-null values
+    :return: function converting a column of values, or None if Arrow takes them as they are
+    """
+    import pyarrow.types
+
+    if pyarrow.types.is_list(column_type):
+        return to_string_lists
+
+    if pyarrow.types.is_string(column_type) and not kinds <= {'str'}:
+        return to_strings
+
+    return None
+
+
+def write_parquet(path, rows, first_columns=('id', 'title')):
+    """
+    Write flattened rows to a Parquet file. Rows are spilled to a temporary
+    file while the columns and their types are collected, and then written
+    in batches of row groups, so only one batch is held in memory.
+    :param path: the file path
+    :param rows: iterable of dict rows
+    :param first_columns: columns to move to the front
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise click.UsageError('Parquet export needs pyarrow. Install it with `pip install zenkly[parquet]`.')
+
+    with spill_rows(rows, track_types=True) as (positions, types, read_rows):
+        columns = order_columns(positions, first_columns) or list(first_columns)
+        schema = pyarrow.schema([(column, get_column_type(types.get(column, set()))) for column in columns])
+        spilled = read_rows(columns) if positions else iter(())
+        converters = [get_column_converter(field.type, types.get(field.name, set())) for field in schema]
+
+        with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+            while True:
+                batch = list(itertools.islice(spilled, PARQUET_BATCH_SIZE))
+
+                if not batch:
+                    break
+
+                writer.write_table(pyarrow.table(
+                    [values if convert is None else convert(values)
+                     for convert, values in zip(converters, zip(*batch))],
+                    schema=schema))
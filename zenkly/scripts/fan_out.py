@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import click
+from .lazy_group import LazyGroup
+
+FAN_OUT_COMMANDS = {'get-macros', 'get-triggers', 'get-automations', 'get-views', 'backup-guide', 'rule-references'}
+
+
+class ProfileGroup(LazyGroup):
+    """
+    Click group that can run its subcommand for several profiles at once.
+    When the group was given `--profiles` or `--all-profiles`, the resolved
+    subcommand is wrapped so that its callback runs once per profile on a
+    thread pool, each with its own configuration (and so its own client,
+    connection pool and rate limiter).
+    """
+
+    def resolve_command(self, ctx, args):
+        cmd_name, cmd, args = super().resolve_command(ctx, args)
+
+        # Commands are resolved before the group callback reads the profiles into ctx.obj, so go by its params.
+        if cmd is not None and (ctx.params.get('profiles') is not None or ctx.params.get('all_profiles')):
+            if cmd.name not in FAN_OUT_COMMANDS:
+                raise click.UsageError(f"`{cmd.name}` can't be run for several profiles. Supported commands: "
+                                       f"{', '.join(sorted(FAN_OUT_COMMANDS))}", ctx=ctx)
+
+            cmd = fan_out_command(cmd)
+
+        return cmd_name, cmd, args
+
+
+def fan_out_command(cmd):
+    """
+    Wrap a command so it runs once for every profile in ctx.obj['profiles'].
+    :param cmd: the command to wrap
+    :return: a command with the same name and params
+    """
+    @click.pass_context
+    def callback(ctx, **kwargs):
+        run_for_profiles(ctx, cmd, kwargs)
+
+    return click.Command(name=cmd.name, params=cmd.params, callback=callback, help=cmd.help,
+                         short_help=cmd.short_help)
+
+
+def run_for_profiles(ctx, cmd, kwargs):
+    """
+    Invoke a command for every profile at once and print a combined summary.
+    :param ctx: the context of the wrapped command
+    :param cmd: the command to invoke
+    :param kwargs: the parsed params of the command
+    """
+    profiles = ctx.obj.get('profiles')
+
+    if not profiles:
+        raise click.UsageError('No profiles selected.', ctx=ctx)
+
+    def invoke(profile):
+        obj = {**ctx.obj, 'profile': profile, 'configuration': profiles[profile], 'output_subdirectory': profile}
+        profile_ctx = click.Context(cmd, info_name=cmd.name, parent=ctx.parent, obj=obj)
+        start = time.perf_counter()
+
+        try:
+            # Context.invoke pushes profile_ctx, so pass_context in this worker thread sees it.
+            profile_ctx.invoke(cmd.callback, **kwargs)
+            status = 'done'
+        except click.exceptions.Abort:
+            status = 'aborted'
+        except click.ClickException as err:
+            status = f"failed: {err.format_message()}"
+        except Exception as err:
+            status = f"failed: {err!r}"
+
+        return profile, status, time.perf_counter() - start
+
+    from tabulate import tabulate
+
+    with ThreadPoolExecutor(max_workers=len(profiles)) as executor:
+        results = list(executor.map(invoke, profiles))
+
+    click.echo()
+    click.echo(tabulate([(profile, status, f"{duration:.1f}s") for profile, status, duration in results],
+                        headers=['Profile', 'Status', 'Time']))
+
+    failed = [profile for profile, status, _ in results if status != 'done']
+
+    if failed:
+        raise click.ClickException(f"{cmd.name} did not complete for: {', '.join(failed)}")
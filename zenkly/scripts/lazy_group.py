@@ -0,0 +1,27 @@
+import importlib
+import click
+
+
+class LazyGroup(click.Group):
+    """
+    Click group that imports the module of a subcommand only when the
+    subcommand is looked up, so running one command doesn't pay for
+    importing every other one (and their dependencies).
+    """
+
+    def __init__(self, *args, lazy_subcommands=None, **kwargs):
+        """
+        :param lazy_subcommands: dict of command name to 'module.path:attribute' of the command
+        """
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        return sorted({*super().list_commands(ctx), *self.lazy_subcommands})
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_subcommands and cmd_name not in self.commands:
+            module_name, attribute = self.lazy_subcommands[cmd_name].split(':')
+            self.add_command(getattr(importlib.import_module(module_name), attribute), cmd_name)
+
+        return super().get_command(ctx, cmd_name)
@@ -0,0 +1,170 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|\.json|$)')
+
+_metrics = None
+
+
+def enable_metrics(trace_file=None):
+    """
+    Start recording metrics for this invocation.
+    :param trace_file: path to write a Chrome trace of every request, wait and list to, if any
+    :return: the metrics recorder
+    """
+    global _metrics
+    _metrics = Metrics(trace_file)
+
+    return _metrics
+
+
+def get_metrics():
+    """
+    :return: the metrics recorder, or None if metrics are not enabled
+    """
+    return _metrics
+
+
+def get_endpoint(method, url):
+    """
+    Group a request with others to the same endpoint, e.g.
+    `GET mysubdomain.zendesk.com/api/v2/macros/{id}.json`.
+    :param method: the HTTP method
+    :param url: the request url
+    :return: the endpoint name
+    """
+    url = urlsplit(url)
+
+    return f"{method} {url.netloc}{_ID_SEGMENT.sub('/{id}', url.path)}"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Metrics:
+    """
+    Records the latency, status and size of every request, the time spent
+    waiting on the rate limiter and between retries, and the records per
+    second of every list fetched. Prints a summary table at the end of a
+    run and optionally writes each event to a trace file in the Chrome
+    trace event format (one event per line), which can be opened in
+    chrome://tracing or https://ui.perfetto.dev to see where a run spends
+    its time.
+    """
+
+    def __init__(self, trace_file=None):
+        """
+        :param trace_file: path to write the trace to, if any
+        """
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.bytes = Counter()
+        self.waits = defaultdict(float)
+        self.lists = []
+        self.trace = None
+
+        if trace_file:
+            self.trace = open(trace_file, 'w')
+            # The closing bracket of the JSON array format is optional, so events can be written as they happen.
+            self.trace.write('[\n')
+
+    def _trace_event(self, name, category, start, duration, args=None):
+        if self.trace is None:
+            return
+
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round((start - self.start) * 1e6),
+            'dur': round(duration * 1e6),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args or {},
+        }
+
+        self.trace.write(json.dumps(event) + ',\n')
+
+    def record_request(self, method, url, status, start, duration, size):
+        """
+        :param method: the HTTP method
+        :param url: the request url
+        :param status: the response status code, or the name of the connection error
+        :param start: `time.perf_counter()` when the request was sent
+        :param duration: seconds until the response was read
+        :param size: bytes received
+        """
+        endpoint = get_endpoint(method, url)
+
+        with self.lock:
+            self.latencies[endpoint].append(duration)
+            self.bytes[endpoint] += size
+
+            if not isinstance(status, int) or status >= 400:
+                self.errors[endpoint] += 1
+
+            self._trace_event(endpoint, 'request', start, duration, {'url': url, 'status': status, 'bytes': size})
+
+    def record_wait(self, reason, start, duration):
+        """
+        :param reason: what was waited for, e.g. 'rate limit' or 'retry'
+        :param start: `time.perf_counter()` when the wait started
+        :param duration: seconds waited
+        """
+        if duration <= 0:
+            return
+
+        with self.lock:
+            self.waits[reason] += duration
+            self._trace_event(reason, 'wait', start, duration)
+
+    def record_list(self, url, records, start, duration):
+        """
+        :param url: the url of the list endpoint
+        :param records: the number of records listed
+        :param start: `time.perf_counter()` when the listing started
+        :param duration: seconds until the last record was read
+        """
+        endpoint = get_endpoint('GET', url)
+
+        with self.lock:
+            self.lists.append((endpoint, records, duration))
+            self._trace_event(endpoint, 'list', start, duration, {'records': records})
+
+    def summary(self):
+        """
+        :return: tables of the requests, lists and waits of the run
+        """
+        from tabulate import tabulate
+
+        with self.lock:
+            requests = tabulate(
+                [(endpoint, len(latencies), self.errors[endpoint], f"{percentile(latencies, 0.5) * 1000:.0f}",
+                  f"{percentile(latencies, 0.95) * 1000:.0f}", f"{max(latencies) * 1000:.0f}",
+                  f"{self.bytes[endpoint] / 1024:.1f}")
+                 for endpoint, latencies in sorted(self.latencies.items())],
+                headers=['Endpoint', 'Requests', 'Errors', 'p50 ms', 'p95 ms', 'Max ms', 'KB'])
+
+            lists = tabulate(
+                [(endpoint, records, f"{duration:.1f}", f"{records / duration if duration else 0:.0f}")
+                 for endpoint, records, duration in self.lists],
+                headers=['List', 'Records', 'Seconds', 'Records/s'])
+
+            total = time.perf_counter() - self.start
+            waits = ', '.join(f"{reason}: {seconds:.1f}s" for reason, seconds in sorted(self.waits.items()))
+
+        return '\n\n'.join([requests, lists, f"Total: {total:.1f}s. Waiting, summed over threads: {waits or 'none'}."])
+
+    def close(self):
+        if self.trace:
+            self.trace.close()
@@ -0,0 +1,169 @@
+import json
+import threading
+from collections import defaultdict
+
+GRAPH_FORMATS = ('json', 'dot')
+# Fields whose value is a space-separated list of tags, each of which is a reference of its own.
+TAG_FIELDS = {'current_tags', 'set_tags', 'remove_tags'}
+
+
+def get_rule_references(rule):
+    """
+    List the fields and values a business rule references, in its
+    conditions, its actions and, for views, its columns and grouping.
+    :param rule: the macro, trigger, automation or view
+    :return: generator of (role, field, operator, value) tuples, with None for a missing operator or value
+    """
+    conditions = rule.get('conditions') or {}
+
+    for condition_type in ('all', 'any'):
+        for condition in conditions.get(condition_type) or []:
+            for value in get_reference_values(condition['field'], condition.get('value')):
+                yield f"condition:{condition_type}", condition['field'], condition.get('operator'), value
+
+    for action in rule.get('actions') or []:
+        for value in get_reference_values(action['field'], action.get('value')):
+            yield 'action', action['field'], None, value
+
+    execution = rule.get('execution') or {}
+
+    for column in execution.get('columns') or []:
+        yield 'column', get_column_field(column['id']), None, None
+
+    for role in ('group_by', 'sort_by'):
+        if execution.get(role) is not None:
+            yield role, get_column_field(execution[role]), None, None
+
+
+def get_column_field(column_id):
+    # Views refer to custom fields by their bare id, and to every other field by name.
+    return f"custom_fields_{column_id}" if isinstance(column_id, int) else column_id
+
+
+def get_reference_values(field, value):
+    """
+    Split the value of a condition or action into the values it references.
+    :param field: the field of the condition or action
+    :param value: its value
+    :return list: the values as strings, or [None] when there is no value
+    """
+    if isinstance(value, list):
+        values = [v for v in value if isinstance(v, (str, int, float, bool))]
+    elif field in TAG_FIELDS and isinstance(value, str):
+        values = value.split()
+    else:
+        values = [value]
+
+    return [None if v is None or v == '' else str(v) for v in values] or [None]
+
+
+def quote_dot_id(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def parse_reference(reference):
+    """
+    :param reference: a query like `custom_fields_123` or `group_id=456`
+    :return tuple: the field, and the value or None to match any value
+    """
+    field, _, value = reference.partition('=')
+
+    return field, value or None
+
+
+class RuleIndex:
+    """
+    Inverted index from the fields and values referenced by business rules
+    to the rules that reference them, e.g. from `group_id=456` to every
+    trigger, automation, macro and view that uses group 456. Lookups are
+    dict lookups, so they cost the same on accounts with tens of thousands
+    of rules. Rules are reduced to their title as they are added, so the
+    rules themselves don't need to be kept in memory.
+    """
+
+    def __init__(self):
+        self.titles = {}
+        self.by_value = defaultdict(list)
+        self.by_field = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def add_rule(self, kind, rule):
+        """
+        :param kind: the kind of rule (macro, trigger, automation, view)
+        :param rule: the rule
+        """
+        rule_key = (kind, rule['id'])
+        references = list(get_rule_references(rule))
+
+        with self.lock:
+            self.titles[rule_key] = rule.get('title')
+
+            for role, field, operator, value in references:
+                usage = (rule_key, role, operator, value)
+                self.by_value[(field, value)].append(usage)
+                self.by_field[field].append(usage)
+
+    def add_rules(self, kind, rules):
+        for rule in rules:
+            self.add_rule(kind, rule)
+
+    def find(self, field, value=None):
+        """
+        Find the rules referencing a field, or one value of a field.
+        :param field: the field, e.g. custom_fields_123 or group_id
+        :param value: the value, or None for any value
+        :return list: (kind, id, title, role, operator, value) of every reference
+        """
+        usages = self.by_field.get(field, []) if value is None else self.by_value.get((field, value), [])
+
+        return [(kind, rule_id, self.titles[(kind, rule_id)], role, operator, used_value)
+                for (kind, rule_id), role, operator, used_value in usages]
+
+    def count_rules_by_field(self):
+        """
+        :return list: (field, number of rules referencing it), most referenced first
+        """
+        counts = {field: len({rule_key for rule_key, _, _, _ in usages}) for field, usages in self.by_field.items()}
+
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+    def get_edges(self):
+        """
+        :return: generator of (rule node, reference node, role, operator) edges of the rule graph
+        """
+        for (field, value), usages in self.by_value.items():
+            reference = field if value is None else f"{field}={value}"
+
+            for (kind, rule_id), role, operator, _ in usages:
+                yield f"{kind}:{rule_id}", reference, role, operator
+
+    def write_json(self, f):
+        """
+        Write the rule graph as node-link JSON, with a node per rule and per
+        referenced field or value, and an edge per reference.
+        :param f: file open for writing
+        """
+        nodes = [{'id': f"{kind}:{rule_id}", 'type': kind, 'title': title}
+                 for (kind, rule_id), title in self.titles.items()]
+        nodes.extend({'id': field if value is None else f"{field}={value}", 'type': 'reference', 'field': field,
+                      'value': value} for field, value in self.by_value)
+        links = [{'source': source, 'target': target, 'role': role, 'operator': operator}
+                 for source, target, role, operator in self.get_edges()]
+
+        json.dump({'directed': True, 'nodes': nodes, 'links': links}, f, indent=2)
+
+    def write_dot(self, f):
+        """
+        Write the rule graph in the Graphviz DOT language.
+        :param f: file open for writing
+        """
+        f.write('digraph rules {\n')
+
+        for (kind, rule_id), title in self.titles.items():
+            f.write(f"  {quote_dot_id(f'{kind}:{rule_id}')} [label={quote_dot_id(f'{kind}: {title}')}];\n")
+
+        for source, target, role, operator in self.get_edges():
+            label = role if operator is None else f"{role} {operator}"
+            f.write(f"  {quote_dot_id(source)} -> {quote_dot_id(target)} [label={quote_dot_id(label)}];\n")
+
+        f.write('}\n')
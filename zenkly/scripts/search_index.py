@@ -0,0 +1,314 @@
+import io
+import os
+import re
+import ast
+import csv
+import json
+import html
+import glob
+import sqlite3
+import hashlib
+import zipfile
+import click
+from .constants import STORE_DIRNAME
+from .backup_store import list_manifests, read_manifest, read_objects
+
+INDEX_FILENAME = 'guide_index.sqlite'
+# Bumped on every change to SCHEMA. Indexes of an older version are dropped and rebuilt, as they only hold backup data.
+SCHEMA_VERSION = 2
+# Relevance weight of each indexed column, so a match in a title outranks one deep in a body.
+COLUMN_WEIGHTS = (10.0, 1.0, 5.0, 1.0, 2.0, 2.0)
+
+_TAG = re.compile(r'<[^>]+>')
+_SPACE = re.compile(r'\s+')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    row_id INTEGER PRIMARY KEY,
+    id INTEGER NOT NULL,
+    locale TEXT NOT NULL,
+    title TEXT,
+    body TEXT,
+    labels TEXT,
+    section TEXT,
+    category TEXT,
+    html_url TEXT,
+    updated_at TEXT,
+    digest TEXT,
+    UNIQUE (id, locale)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, body, labels, locale, section, category,
+    content='articles', content_rowid='row_id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS articles_insert AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, title, body, labels, locale, section, category)
+    VALUES (new.row_id, new.title, new.body, new.labels, new.locale, new.section, new.category);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_delete AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, body, labels, locale, section, category)
+    VALUES ('delete', old.row_id, old.title, old.body, old.labels, old.locale, old.section, old.category);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_update AFTER UPDATE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, body, labels, locale, section, category)
+    VALUES ('delete', old.row_id, old.title, old.body, old.labels, old.locale, old.section, old.category);
+    INSERT INTO articles_fts (rowid, title, body, labels, locale, section, category)
+    VALUES (new.row_id, new.title, new.body, new.labels, new.locale, new.section, new.category);
+END;
+CREATE TABLE IF NOT EXISTS index_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+DROP_SCHEMA = """
+DROP TABLE IF EXISTS articles_fts;
+DROP TABLE IF EXISTS articles;
+DROP TABLE IF EXISTS index_state;
+"""
+
+
+def get_index_path(directory, index_path=None):
+    return index_path or os.path.join(directory, INDEX_FILENAME)
+
+
+def open_index(path):
+    """
+    Open a search index, creating its tables if needed.
+    :param path: the index path
+    :return: sqlite3 connection
+    """
+    connection = sqlite3.connect(path)
+    version = connection.execute('PRAGMA user_version').fetchone()[0]
+
+    try:
+        if version != SCHEMA_VERSION:
+            # Dropping the tables drops their triggers too.
+            connection.executescript(DROP_SCHEMA)
+
+        connection.executescript(SCHEMA)
+    except sqlite3.OperationalError as err:
+        connection.close()
+        raise click.ClickException(f"Could not create the search index, as SQLite was built without FTS5: {err}")
+
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    return connection
+
+
+def get_indexed_backup_time(connection):
+    row = connection.execute("SELECT value FROM index_state WHERE key = 'backup_time'").fetchone()
+
+    return int(row[0]) if row else None
+
+
+def list_backups(directory):
+    """
+    List the backups in a backup directory, as written by backup-guide with
+    or without --store.
+    :param directory: the backup directory
+    :return dict: backup time to the archive path, or None for a backup in the store
+    """
+    backups = {}
+
+    for path in glob.glob(os.path.join(directory, 'backup_*.zip')):
+        backup_time = os.path.basename(path)[len('backup_'):-len('.zip')]
+
+        if backup_time.isdigit():
+            backups[int(backup_time)] = path
+
+    for backup_time in list_manifests(os.path.join(directory, STORE_DIRNAME)):
+        backups.setdefault(backup_time, None)
+
+    return backups
+
+
+def read_csv_items(f):
+    """
+    Read the items of a CSV backup, parsing the lists (e.g. label names)
+    that `write_csv` wrote as text.
+    :param f: binary file of the CSV entry
+    :return: generator of items
+    """
+    for row in csv.DictReader(io.TextIOWrapper(f, encoding='utf-8', newline='')):
+        for key, value in row.items():
+            if value.startswith('['):
+                try:
+                    row[key] = ast.literal_eval(value)
+                except (ValueError, SyntaxError):
+                    pass
+
+        yield row
+
+
+def read_backup(directory, backup_time, archive_path, guide_type):
+    """
+    Read the items of one type from a backup.
+    :param directory: the backup directory
+    :param backup_time: the backup time
+    :param archive_path: the archive of the backup, or None for a backup in the store
+    :param guide_type: the item type (articles, sections, categories)
+    :return: iterable of items
+    """
+    if archive_path is None:
+        store_path = os.path.join(directory, STORE_DIRNAME)
+
+        return read_objects(store_path, read_manifest(store_path, backup_time)[guide_type])
+
+    with zipfile.ZipFile(archive_path) as archive:
+        names = archive.namelist()
+
+        if f"{guide_type}.json" in names:
+            with archive.open(f"{guide_type}.json") as f:
+                return json.load(f)
+
+        if f"{guide_type}.csv" in names:
+            with archive.open(f"{guide_type}.csv") as f:
+                return list(read_csv_items(f))
+
+    raise click.ClickException(f"No {guide_type} found in {click.format_filename(archive_path)}")
+
+
+def html_to_text(body):
+    return _SPACE.sub(' ', html.unescape(_TAG.sub(' ', body or ''))).strip()
+
+
+def get_translations(item):
+    """
+    Get every language version of a help center item. Backups include the
+    translations of each item, the source locale among them; an item
+    without any stands for itself.
+    :param item: the article, section or category
+    :return list: the translations
+    """
+    translations = [t for t in item.get('translations') or [] if t.get('locale')]
+    locales = {t['locale'] for t in translations}
+
+    if item.get('locale') not in locales:
+        translations.insert(0, item)
+
+    return translations
+
+
+def get_article_rows(articles, sections, categories):
+    """
+    Flatten articles into index rows, one per translation, with the names
+    of their section and category in the same locale and the text of
+    their body.
+    :param articles: the articles
+    :param sections: the sections
+    :param categories: the categories
+    :return: generator of row tuples, ending with a digest of the row
+    """
+    def get_names(items):
+        # Names by (id, locale), and by id alone in the source locale for locales an item isn't translated to.
+        names = {}
+
+        for item in items:
+            for translation in get_translations(item):
+                names[(str(item['id']), translation['locale'])] = translation.get('title') or translation.get('name')
+
+            names[str(item['id'])] = item.get('name') or item.get('title')
+
+        return names
+
+    category_names = get_names(categories)
+    section_names = get_names(sections)
+    section_categories = {str(section['id']): str(section.get('category_id')) for section in sections}
+
+    for article in articles:
+        section_id = str(article.get('section_id'))
+        category_id = section_categories.get(section_id)
+        labels = ', '.join(article.get('label_names') or [])
+
+        for translation in get_translations(article):
+            locale = translation['locale']
+            section = section_names.get((section_id, locale), section_names.get(section_id))
+            category = category_names.get((category_id, locale), category_names.get(category_id))
+
+            row = (int(article['id']), locale, translation.get('title'), html_to_text(translation.get('body')),
+                   labels, section, category, translation.get('html_url') or article.get('html_url'),
+                   translation.get('updated_at') or article.get('updated_at'))
+
+            yield row + (hashlib.sha1(json.dumps(row).encode('utf-8')).hexdigest(),)
+
+
+def update_index(connection, directory, backup_time, archive_path):
+    """
+    Bring an index up to date with a backup. Only article translations
+    whose content changed since the last backup indexed are rewritten, and
+    the ones no longer in the backup are removed.
+    :param connection: the index connection
+    :param directory: the backup directory
+    :param backup_time: the backup time
+    :param archive_path: the archive of the backup, or None for a backup in the store
+    :return dict: the number of added, updated, removed and unchanged article translations
+    """
+    digests = {(article_id, locale): digest
+               for article_id, locale, digest in connection.execute('SELECT id, locale, digest FROM articles')}
+    counts = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    changed = []
+
+    rows = get_article_rows(read_backup(directory, backup_time, archive_path, 'articles'),
+                            read_backup(directory, backup_time, archive_path, 'sections'),
+                            read_backup(directory, backup_time, archive_path, 'categories'))
+
+    for row in rows:
+        digest = digests.pop(row[:2], None)
+
+        if digest == row[-1]:
+            counts['unchanged'] += 1
+            continue
+
+        counts['added' if digest is None else 'updated'] += 1
+        changed.append(row)
+
+    # Whatever is left was deleted from the help center since the last backup indexed.
+    counts['removed'] = len(digests)
+
+    with connection:
+        connection.executemany('DELETE FROM articles WHERE id = ? AND locale = ?', digests)
+        connection.executemany(
+            'INSERT INTO articles (id, locale, title, body, labels, section, category, html_url, updated_at, digest) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (id, locale) DO UPDATE SET title = excluded.title, body = excluded.body, '
+            'labels = excluded.labels, section = excluded.section, category = excluded.category, '
+            'html_url = excluded.html_url, updated_at = excluded.updated_at, digest = excluded.digest',
+            changed)
+        connection.execute("INSERT OR REPLACE INTO index_state (key, value) VALUES ('backup_time', ?)",
+                           (str(backup_time),))
+
+    return counts
+
+
+def search_index(connection, query, locale=None, label=None, limit=20):
+    """
+    Search an index with an FTS5 query, e.g. `refund`, `"gift card"`,
+    `title:refund AND labels:billing` or `categ*`.
+    :param connection: the index connection
+    :param query: the FTS5 query
+    :param locale: only return article translations in this locale
+    :param label: only return articles with this label
+    :param limit: the max number of results
+    :return list: rows of id, title, section, locale, html_url and a snippet of the body, best match first
+    """
+    sql = ('SELECT a.id, a.title, a.section, a.locale, a.html_url, '
+           "snippet(articles_fts, 1, '[', ']', '...', 12) "
+           'FROM articles_fts JOIN articles a ON a.row_id = articles_fts.rowid '
+           'WHERE articles_fts MATCH ?')
+    params = [query]
+
+    if locale:
+        sql += ' AND a.locale = ?'
+        params.append(locale)
+
+    if label:
+        sql += " AND ', ' || a.labels || ', ' LIKE ?"
+        params.append(f"%, {label}, %")
+
+    sql += f" ORDER BY bm25(articles_fts, {', '.join(map(str, COLUMN_WEIGHTS))}) LIMIT ?"
+    params.append(limit)
+
+    try:
+        return connection.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as err:
+        raise click.UsageError(f"Invalid search query {query!r}: {err}")
@@ -1,68 +1,57 @@
 import os
 import csv
+import math
+import itertools
 import errno
 import json
+import operator
 import click
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import time
-import shutil
+import tempfile
 import threading
-from functools import wraps
-import git
-from .constants import VALID_HC_TYPES
+import textwrap
+import zipfile
+from datetime import datetime, timezone
+from .client import get_client
+from .checkpoint import PageJournal, ApplyJournal
+from .metrics import get_metrics
+from .constants import (VALID_HC_TYPES, PAGE_SIZE, MAX_OFFSET_PAGES, BULK_SIZE, BACKUP_STATE_FILENAME, MACRO_ENTRIES,
+                        BULK_MACRO_ENTRIES)
 
+_git_lock = threading.Lock()
 
-def rate_limited(max_per_second: int):
+
+def raise_for_status(r):
     """
-    Rate-limits the decorated function locally, for one process.
-    :param max_per_second: the number of requests allowed per second
-    :return: the decorated function
+    Raise HTTP errors (4xx, 5xx) of a response as a click error.
+    :param r: the response
     """
-    lock = threading.Lock()
-    min_interval = 1.0 / max_per_second
-
-    def decorate(func):
-        last_time_called = time.perf_counter()
-
-        @wraps(func)
-        def rate_limited_function(*args, **kwargs):
-            lock.acquire()
-            nonlocal last_time_called
-            try:
-                elapsed = time.perf_counter() - last_time_called
-                left_to_wait = min_interval - elapsed
-                if left_to_wait > 0:
-                    time.sleep(left_to_wait)
-
-                return func(*args, **kwargs)
-            finally:
-                last_time_called = time.perf_counter()
-                lock.release()
+    from requests.exceptions import HTTPError
 
-        return rate_limited_function
-
-    return decorate
+    try:
+        r.raise_for_status()
+    except HTTPError as err:
+        raise click.ClickException(err)
 
 
-@rate_limited(1)
-def get(config, url, params={}):
+def get(config, url, params={}, cache=True):
     """
     GET the provided endpoint.
     :param config: context config
     :param url: the url to GET
+    :param cache: flag to allow a cached response (when the cache is enabled)
     :return:
     """
-    r = requests.get(
+    r = get_client(config).request(
+        'GET',
         url,
         params=params,
-        auth=(config['email'], config['password'])
+        cache=cache
     )
 
-    # Check for HTTP errors (4xx, 5xx).
-    try:
-        r.raise_for_status()
-    except requests.exceptions.HTTPError as err:
-        raise click.ClickException(err)
+    raise_for_status(r)
 
     # Attempt to parse JSON. If valid JSON contains an error, raise it.
     # If JSON is invalid, raise the error.
@@ -76,7 +65,6 @@ def get(config, url, params={}):
     return res
 
 
-@rate_limited(1)
 def put(config, url, data):
     """
     PUT data to the provided endpoint.
@@ -85,17 +73,13 @@ def put(config, url, data):
     :param data: the data to PUT
     :return:
     """
-    r = requests.put(
+    r = get_client(config).request(
+        'PUT',
         url,
-        auth=(config['email'], config['password']),
         json=data
     )
 
-    # Check for HTTP errors (4xx, 5xx).
-    try:
-        r.raise_for_status()
-    except requests.exceptions.HTTPError as err:
-        raise click.ClickException(err)
+    raise_for_status(r)
 
     # Attempt to parse JSON. If valid JSON contains an error, raise it.
     # If JSON is invalid, raise the error.
@@ -109,7 +93,6 @@ def put(config, url, data):
     return res
 
 
-@rate_limited(1)
 def post(config, url, data={}):
     """
     POST data to the provided endpoint.
@@ -118,17 +101,13 @@ def post(config, url, data={}):
     :param data: the data to POST
     :return:
     """
-    r = requests.post(
+    r = get_client(config).request(
+        'POST',
         url,
-        auth=(config['email'], config['password']),
         json=data,
     )
 
-    # Check for HTTP errors (4xx, 5xx).
-    try:
-        r.raise_for_status()
-    except requests.exceptions.HTTPError as err:
-        raise click.ClickException(err)
+    raise_for_status(r)
 
     # Attempt to parse JSON. If valid JSON contains an error, raise it.
     # If JSON is invalid, raise the error.
@@ -142,28 +121,26 @@ def post(config, url, data={}):
     return res
 
 
-@rate_limited(1)
-def post_form_data(config, url, data={}, files={}):
+def post_form_data(config, url, data={}, files={}, external=False):
     """
     POST data to the provided endpoint.
     :param config: context config
     :param url: the url to POST the data to
     :param data: the data to POST
+    :param files: the files to POST, rewound before every retry
+    :param external: flag for a url outside the Zendesk API, sent without Zendesk credentials or rate limiting
     :return:
     """
 
-    r = requests.post(
+    r = get_client(config).request(
+        'POST',
         url,
-        auth=(config['email'], config['password']),
         data=data,
-        files=files
+        files=files,
+        external=external
     )
 
-    # Check for HTTP errors (4xx, 5xx).
-    try:
-        r.raise_for_status()
-    except requests.exceptions.HTTPError as err:
-        raise click.ClickException(err)
+    raise_for_status(r)
 
     return r
 
@@ -200,7 +177,7 @@ def get_theme_job(config, job_id):
     """
     url = f"https://{config['subdomain']}.zendesk.com/api/v2/guide/theming/jobs/{job_id}"
 
-    res = get(config, url)
+    res = get(config, url, cache=False)
 
     return res['job']
 
@@ -215,7 +192,8 @@ def post_theme(config, storage_url, parameters, files):
     """
     data = {**parameters}
 
-    res = post_form_data(config, storage_url, data=data, files=files)
+    # The storage url is not part of the Zendesk API, so it's not subject to its credentials or rate limit.
+    res = post_form_data(config, storage_url, data=data, files=files, external=True)
 
     return res
 
@@ -247,12 +225,169 @@ def publish_theme(config, brand_id, theme_id):
     return res['theme']
 
 
-def get_all_macros(config, category=None, active_only=False):
+def get_next_page(res, params={}):
+    """
+    Get the request for the page after a page of a list endpoint.
+    :param res: the page response
+    :param params: query params of the list
+    :return: (url, params) of the next page, or None after the last page
+    """
+    if 'meta' in res:
+        # links.next already carries every param
+        return (res['links']['next'], {}) if res['meta']['has_more'] else None
+
+    if res.get('next_page'):
+        return res['next_page'], params
+
+    return None
+
+
+def iter_cursor_pages(config, url, params={}, start=None):
+    """
+    Iterate over the pages of a list endpoint using cursor pagination
+    (`page[size]`, `meta.has_more`, `links.next`), so every page costs the
+    same no matter how deep it is. Falls back to following `next_page`
+    if the endpoint answers with offset pagination instead.
+    :param config: context config
+    :param url: the url of the list endpoint
+    :param params: query params for the first page
+    :param start: (url, params) of the page to start from instead of the first, as given by `get_next_page`
+    :return: generator of page responses
+    """
+    page = start or (url, {**params, 'page[size]': PAGE_SIZE})
+
+    while page:
+        res = get(config, page[0], params=page[1])
+        yield res
+
+        page = get_next_page(res, params)
+
+
+def iter_offset_pages(config, url, params={}, concurrency=1, start_page=1, first=None):
+    """
+    Iterate over the pages of a list endpoint using offset pagination. With
+    a concurrency above 1, every page url is worked out from the `count` of
+    the first page and the remaining pages are fetched by a bounded thread
+    pool. Pages are yielded in order either way.
+    :param config: context config
+    :param url: the url of the list endpoint
+    :param params: query params sent with every page
+    :param concurrency: max pages fetched at once
+    :param start_page: the page number to start from
+    :param first: the response of the first page, if already fetched
+    :return: generator of page responses
+    """
+    params = {**params, 'per_page': PAGE_SIZE}
+
+    if first is not None and start_page == 1:
+        res = first
+    else:
+        res = get(config, url, params=params if start_page == 1 else {**params, 'page': start_page})
+
+    yield res
+
+    if concurrency > 1 and res.get('next_page'):
+        page_count = math.ceil(res['count'] / PAGE_SIZE)
+        page_params = [{**params, 'page': page} for page in range(start_page + 1, page_count + 1)]
+
+        # Responses come back in request order, keeping the output deterministic.
+        yield from fetch_all(config, [('GET', url, p) for p in page_params], concurrency=concurrency)
+    else:
+        while res.get('next_page'):
+            res = get(config, res['next_page'], params=params)
+            yield res
+
+
+def get_all_pages(config, url, key, params={}, concurrency=1, label=None, cursor=True):
+    """
+    Get all records of a list endpoint, yielded page by page as they
+    arrive. Uses cursor pagination where the endpoint supports it, and
+    offset pagination otherwise or when pages are fetched concurrently
+    (page numbers are needed to split the work). As Zendesk only serves the
+    first MAX_OFFSET_PAGES offset pages, a list found to be longer on its
+    first page is fetched with cursor pagination after all, one page at a
+    time. With `zenkly --checkpoint`,
+    every page is recorded in a journal, so an interrupted listing can be
+    resumed from the last good page with `zenkly --resume`.
+    :param config: context config
+    :param url: the url of the list endpoint
+    :param key: the key holding the records in each page
+    :param params: query params
+    :param concurrency: max pages fetched at once
+    :param label: progress bar label
+    :param cursor: whether the endpoint supports cursor pagination
+    :return: generator of records
+    """
+    start = time.perf_counter()
+    use_cursor = cursor and concurrency == 1
+    count = None
+    offset_first = None
+
+    if cursor and concurrency > 1:
+        offset_first = get(config, url, params={**params, 'per_page': PAGE_SIZE})
+        count = offset_first.get('count')
+
+        if count and count > MAX_OFFSET_PAGES * PAGE_SIZE:
+            click.echo(f"Listing {count} records one page at a time, as only the first "
+                       f"{MAX_OFFSET_PAGES * PAGE_SIZE} can be fetched concurrently.")
+            use_cursor = True
+            offset_first = None
+
+    journal = PageJournal(config, url, params, mode='cursor' if use_cursor else 'offset')
+    start_page = 1 if use_cursor else journal.position or 1
+
+    if journal.finished:
+        pages = iter(())
+    elif use_cursor:
+        pages = iter_cursor_pages(config, url, params=params, start=journal.position)
+    else:
+        pages = iter_offset_pages(config, url, params=params, concurrency=concurrency, start_page=start_page,
+                                  first=offset_first)
+
+    def record_pages(page_number):
+        for res in pages:
+            if use_cursor:
+                journal.record(res[key], get_next_page(res, params))
+            else:
+                journal.record(res[key], page_number + 1 if res.get('next_page') else None)
+
+            page_number += 1
+            yield from res[key]
+
+    first = next(pages, None)
+
+    if first is not None:
+        pages = itertools.chain([first], pages)
+
+    records = itertools.chain(journal.replay(), record_pages(start_page))
+
+    # Cursor pages carry no count, so unless an offset page gave one, the bar may only show how many were fetched.
+    with click.progressbar(records, length=first and first.get('count') or count, label=label, show_pos=True,
+                           update_min_steps=PAGE_SIZE) as bar:
+        listed = 0
+
+        try:
+            for record in bar:
+                listed += 1
+                yield record
+        except GeneratorExit:
+            # The consumer stopped reading on purpose (e.g. at the first unchanged item), which is no interruption.
+            journal.finish()
+            raise
+
+    journal.finish()
+
+    if get_metrics():
+        get_metrics().record_list(url, listed, start, time.perf_counter() - start)
+
+
+def get_all_macros(config, category=None, active_only=False, concurrency=1):
     """
     Get all pages of macros from Zendesk.
     :param config: context config
     :param category: only get macros from this category
     :param active: flag to only include active macros
+    :param concurrency: max pages fetched at once
     :return:
     """
     url = f"https://{config['subdomain']}.zendesk.com/api/v2/macros.json"
@@ -264,26 +399,16 @@ def get_all_macros(config, category=None, active_only=False):
     if category:
         params['category'] = category
 
-    res = get(config, url, params=params)
-    all = res['macros']
+    return get_all_pages(config, url, 'macros', params=params, concurrency=concurrency, label='Getting macros...')
 
-    with click.progressbar(length=res['count'], label='Getting macros...') as bar:
-        bar.update(len(res['macros']))
 
-        while res['next_page']:
-            res = get(config, res['next_page'], params=params)
-            all = all + res['macros']
-            bar.update(len(res['macros']))
-
-    return all
-
-
-def get_all_triggers(config, category_id=None, active_only=False):
+def get_all_triggers(config, category_id=None, active_only=False, concurrency=1):
     """
     Get all pages of triggers from Zendesk.
     :param config: context config
     :param category_id: only get triggers from this category
     :param active: flag to only include active triggers
+    :param concurrency: max pages fetched at once
     :return:
     """
     url = f"https://{config['subdomain']}.zendesk.com/api/v2/triggers.json"
@@ -295,25 +420,16 @@ def get_all_triggers(config, category_id=None, active_only=False):
     if category_id:
         params['category_id'] = category_id
 
-    res = get(config, url, params=params)
-    all = res['triggers']
-
-    with click.progressbar(length=res['count'], label='Getting triggers...') as bar:
-        bar.update(len(res['triggers']))
-
-        while res['next_page']:
-            res = get(config, res['next_page'], params=params)
-            all = all + res['triggers']
-            bar.update(len(res['triggers']))
+    return get_all_pages(config, url, 'triggers', params=params, concurrency=concurrency,
+                         label='Getting triggers...')
 
-    return all
 
-
-def get_all_automations(config, active_only=False):
+def get_all_automations(config, active_only=False, concurrency=1):
     """
     Get all pages of automations from Zendesk.
     :param config: context config
     :param active: flag to only include active automations
+    :param concurrency: max pages fetched at once
     :return:
     """
     url = f"https://{config['subdomain']}.zendesk.com/api/v2/automations.json"
@@ -322,26 +438,17 @@ def get_all_automations(config, active_only=False):
     if active_only:
         params['active'] = 'true'
 
-    res = get(config, url, params=params)
-    all = res['automations']
-
-    with click.progressbar(length=res['count'], label='Getting automations...') as bar:
-        bar.update(len(res['automations']))
-
-        while res['next_page']:
-            res = get(config, res['next_page'], params=params)
-            all = all + res['automations']
-            bar.update(len(res['automations']))
-
-    return all
+    return get_all_pages(config, url, 'automations', params=params, concurrency=concurrency,
+                         label='Getting automations...')
 
-def get_all_views(config, group_id=None, active_only=False, access=None):
+def get_all_views(config, group_id=None, active_only=False, access=None, concurrency=1):
     """
     Get all pages of automations from Zendesk.
     :param config: context config
     :param group_id: only views belonging to given group
     :param active: flag to only include active automations
     :param access: only views with given access. May be "personal", "shared", or "account"
+    :param concurrency: max pages fetched at once
     :return:
     """
     url = f"https://{config['subdomain']}.zendesk.com/api/v2/views.json"
@@ -356,85 +463,171 @@ def get_all_views(config, group_id=None, active_only=False, access=None):
     if access:
         params['access'] = access
 
-    res = get(config, url, params=params)
-    all = res['views']
+    return get_all_pages(config, url, 'views', params=params, concurrency=concurrency, label='Getting views...')
 
-    with click.progressbar(length=res['count'], label='Getting views...') as bar:
-        bar.update(len(res['views']))
 
-        while res['next_page']:
-            res = get(config, res['next_page'], params=params)
-            all = all + res['views']
-            bar.update(len(res['views']))
+def parse_actions_for_csv(actions, parsed_actions=None):
+    """
+    Group action values by field into `action:<field>` columns.
+    :param actions: the actions of a business rule
+    :param parsed_actions: dict to add the columns to, defaults to a new one
+    :return dict: the columns
+    """
+    if parsed_actions is None:
+        parsed_actions = {}
 
-    print(len(all))
-    return all
+    for action in actions:
+        key_name = f"action:{action['field']}"
 
+        if key_name not in parsed_actions:
+            parsed_actions[key_name] = []
 
-def parse_actions_for_csv(actions):
-    parsed_actions = {}
+        parsed_actions[key_name].append(action['value'])
 
-    for action in actions:
-        action_field = action['field']
-        action_value = action['value']
+    return parsed_actions
 
-        key_name = f"action:{action_field}"
 
-        if not key_name in parsed_actions:
-            parsed_actions[key_name] = []
+def parse_conditions_for_csv(conditions, parsed_conditions=None):
+    """
+    Group conditions by type and field into `condition:<all|any>:<field>` columns.
+    :param conditions: the conditions of a business rule
+    :param parsed_conditions: dict to add the columns to, defaults to a new one
+    :return dict: the columns
+    """
+    if parsed_conditions is None:
+        parsed_conditions = {}
 
-        parsed_actions[key_name].append(action_value)
+    for condition_type in ('all', 'any'):
+        for condition in conditions[condition_type]:
+            key_name = f"condition:{condition_type}:{condition['field']}"
 
-    return parsed_actions
+            if key_name not in parsed_conditions:
+                parsed_conditions[key_name] = []
 
+            parsed_conditions[key_name].append(f"{condition['operator']} {condition['value']}")
 
-def parse_conditions_for_csv(conditions):
-    parsed_conditions = {}
+    return parsed_conditions
 
-    for condition in conditions['all']:
-        key_name = f"condition:all:{condition['field']}"
 
-        if not key_name in parsed_conditions:
-            parsed_conditions[key_name] = []
+def flatten_rule(rule):
+    """
+    Flatten a macro, trigger, automation or view into one CSV row, in place:
+    its actions and conditions are replaced by `action:*`/`condition:*` columns.
+    :param rule: the business rule
+    :return dict: the row
+    """
+    if 'actions' in rule:
+        parse_actions_for_csv(rule.pop('actions'), rule)
 
-        parsed_conditions[key_name].append(f"{condition['operator']} {condition['value']}")
+    if 'conditions' in rule:
+        parse_conditions_for_csv(rule.pop('conditions'), rule)
 
-    for condition in conditions['any']:
-        key_name = f"condition:any:{condition['field']}"
+    return rule
 
-        if not key_name in parsed_conditions:
-            parsed_conditions[key_name] = []
 
-        parsed_conditions[key_name].append(f"{condition['operator']} {condition['value']}")
+def get_job_status(config, job_id):
+    """
+    Retrieve job status data (for polling)
+    :param config: context config
+    :param job_id: the job id to retrieve
+    :return: job status json
+    """
+    url = f"https://{config['subdomain']}.zendesk.com/api/v2/job_statuses/{job_id}.json"
 
-    return parsed_conditions
+    res = get(config, url, cache=False)
+
+    return res['job_status']
 
 
-def post_all_macros(config, data):
+def wait_for_job(config, job_status):
+    """
+    Poll a job status until the job is no longer queued or working.
+    :param config: context config
+    :param job_status: the job status returned when the job was created
+    :return: the final job status json
+    """
+    while job_status['status'] in ('queued', 'working'):
+        time.sleep(1)
+        job_status = get_job_status(config, job_status['id'])
+
+    return job_status
+
+
+def map_concurrently(func, items, concurrency=1):
+    """
+    Call func on every item using a bounded thread pool.
+    :param func: the function to call
+    :param items: the items to call it on
+    :param concurrency: max calls at once
+    :return: generator of results, in item order
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        yield from executor.map(func, items)
+
+
+def fetch_all(config, batch, concurrency=1, return_exceptions=False):
+    """
+    Send a batch of requests concurrently, on a thread pool or, with the
+    async engine, on the asyncio client.
+    :param config: context config
+    :param batch: list of (method, url, payload) tuples; payload is the query params of a GET, else the JSON body
+    :param concurrency: max requests at once
+    :param return_exceptions: flag to yield a failed request's `click.ClickException` instead of raising it
+    :return: generator of parsed JSON responses, in request order
+    """
+    client = get_client(config)
+
+    if client.async_client:
+        yield from client.async_client.fetch_all(batch, concurrency=concurrency,
+                                                 return_exceptions=return_exceptions)
+        return
+
+    verbs = {'GET': lambda url, payload: get(config, url, params=payload),
+             'PUT': lambda url, payload: put(config, url, payload),
+             'POST': lambda url, payload: post(config, url, payload)}
+
+    def send(request):
+        method, url, payload = request
+
+        try:
+            return verbs[method](url, payload)
+        except click.ClickException as err:
+            if not return_exceptions:
+                raise
+
+            return err
+
+    yield from map_concurrently(send, batch, concurrency)
+
+
+def post_all_macros(config, data, concurrency=1):
     """
     Create macros in Zendesk.
     :param config: context config
     :param data: the macro data to POST
+    :param concurrency: max macros sent at once
     """
-    entries = (
-        'title', 'active', 'actions', 'restriction',
-        'description', 'attachments'
-    )
-
     succeeded = []
     failed = []
 
-    with click.progressbar(length=len(data), label='Adding macros...') as bar:
-        for m in data:
-            macro = {'macro': {k: m[k] for k in m if k in entries}}
+    journal = ApplyJournal(config, 'post_macros', [m['id'] for m in data])
+    applied = [m for m in data if journal.is_applied(m['id'])]
+    data = [m for m in data if not journal.is_applied(m['id'])]
+
+    if applied:
+        click.echo(f"Skipping {len(applied)} macros already added by the interrupted run.")
+        succeeded.extend((m['id'], journal.get_result(m['id'])) for m in applied)
 
-            url = f"https://{config['subdomain']}.zendesk.com/api/v2/macros.json"
+    url = f"https://{config['subdomain']}.zendesk.com/api/v2/macros.json"
+    batch = [('POST', url, {'macro': {k: m[k] for k in m if k in MACRO_ENTRIES}}) for m in data]
 
-            try:
-                res = post(config, url, macro)
+    with click.progressbar(length=len(data), label='Adding macros...') as bar:
+        for m, res in zip(data, fetch_all(config, batch, concurrency=concurrency, return_exceptions=True)):
+            if isinstance(res, click.ClickException):
+                failed.append((m['id'], res.message))  # Record failures
+            else:
+                journal.record(m['id'], res['macro']['id'])
                 succeeded.append((m['id'], res['macro']['id']))
-            except click.ClickException as err:
-                failed.append((m['id'], err.message))  # Record failures
 
             bar.update(1)
 
@@ -450,32 +643,97 @@ def post_all_macros(config, data):
             for f in failed:
                 click.secho(f"{f[0]} ({f[1]})", fg='red')
 
+            click.secho('\nRun the command again with `zenkly --resume` to retry only these macros.')
+        else:
+            journal.finish()
 
-def put_all_macros(config, data):
+
+def put_macros_in_bulk(config, macros):
     """
-    Update macros in Zendesk.
+    Update up to BULK_SIZE macros with one update_many request.
     :param config: context config
-    :param data: the macro data to PUT
+    :param macros: the macro updates, each with an id
+    :return list: (id, error) tuples, with error None for each macro that was updated
     """
-    entries = (
-        'title', 'active', 'actions', 'restriction',
-        'description', 'attachments'
-    )
+    url = f"https://{config['subdomain']}.zendesk.com/api/v2/macros/update_many.json"
+
+    try:
+        res = put(config, url, {'macros': macros})
+    except click.ClickException as err:
+        return [(m['id'], err.message) for m in macros]
 
+    if 'job_status' not in res:
+        return [(m['id'], None) for m in macros]
+
+    job_status = wait_for_job(config, res['job_status'])
+    results = {r['id']: r for r in job_status.get('results') or [] if 'id' in r}
+    outcomes = []
+
+    for m in macros:
+        result = results.get(m['id'])
+
+        if result is None:
+            outcomes.append((m['id'], job_status.get('message') or f"job {job_status['status']}"))
+        elif result.get('success', 'error' not in result):
+            outcomes.append((m['id'], None))
+        else:
+            outcomes.append((m['id'], result.get('details') or result.get('error') or result.get('status')))
+
+    return outcomes
+
+
+def put_all_macros(config, data, bulk=False, concurrency=1):
+    """
+    Update macros in Zendesk. In bulk mode, updates Zendesk can apply with
+    update_many (only `active` changes) are sent in batches of BULK_SIZE;
+    every other macro is sent with its own request.
+    :param config: context config
+    :param data: the macro data to PUT
+    :param bulk: flag to batch updates with update_many where possible
+    :param concurrency: max requests sent at once
+    """
     succeeded = []
     failed = []
 
-    with click.progressbar(length=len(data), label='Updating macros...') as bar:
-        for m in data:
-            macro = {'macro': {k: m[k] for k in m if k in entries}}
+    journal = ApplyJournal(config, 'put_macros', [m['id'] for m in data])
+    applied = [m['id'] for m in data if journal.is_applied(m['id'])]
+    data = [m for m in data if not journal.is_applied(m['id'])]
+
+    if applied:
+        click.echo(f"Skipping {len(applied)} macros already updated by the interrupted run.")
+        succeeded.extend(applied)
 
-            url = f"https://{config['subdomain']}.zendesk.com/api/v2/macros/{m['id']}.json"
+    batched = []
+    single = data
 
-            try:
-                put(config, url, macro)
+    if bulk:
+        batched = [{'id': m['id'], **{k: m[k] for k in m if k in MACRO_ENTRIES}} for m in data
+                   if {k for k in m if k in MACRO_ENTRIES} <= BULK_MACRO_ENTRIES]
+        batched_ids = {m['id'] for m in batched}
+        single = [m for m in data if m['id'] not in batched_ids]
+
+    with click.progressbar(length=len(data), label='Updating macros...') as bar:
+        batches = [batched[i:i + BULK_SIZE] for i in range(0, len(batched), BULK_SIZE)]
+
+        for outcomes in map_concurrently(lambda batch: put_macros_in_bulk(config, batch), batches, concurrency):
+            for macro_id, error in outcomes:
+                if error is None:
+                    journal.record(macro_id)
+                    succeeded.append(macro_id)
+                else:
+                    failed.append((macro_id, error))  # Record failures
+
+            bar.update(len(outcomes))
+
+        batch = [('PUT', f"https://{config['subdomain']}.zendesk.com/api/v2/macros/{m['id']}.json",
+                  {'macro': {k: m[k] for k in m if k in MACRO_ENTRIES}}) for m in single]
+
+        for m, res in zip(single, fetch_all(config, batch, concurrency=concurrency, return_exceptions=True)):
+            if isinstance(res, click.ClickException):
+                failed.append((m['id'], res.message))  # Record failures
+            else:
+                journal.record(m['id'])
                 succeeded.append(m['id'])
-            except click.ClickException as err:
-                failed.append((m['id'], err.message))  # Record failures
 
             bar.update(1)
 
@@ -491,58 +749,142 @@ def put_all_macros(config, data):
             for f in failed:
                 click.secho(f"{f[0]} ({f[1]})", fg='red')
 
+            click.secho('\nRun the command again with `zenkly --resume` to retry only these macros.')
+        else:
+            journal.finish()
 
-def get_all_locales(config):
-    url = f"https://{config['subdomain']}.zendesk.com/api/v2/locales.json"
-    res = get(config, url)
-    all_locales = res['locales']
 
-    with click.progressbar(length=res['count'], label='Getting locales...') as bar:
-        bar.update(len(res['locales']))
+def diff_macros(current, edited):
+    """
+    Compare edited macros with the current macros in Zendesk.
+    :param current: the current macros
+    :param edited: the edited macros
+    :return tuple: list of updates holding only the changed fields (plus id), and list of edited macros with
+        no current macro, which are kept whole
+    """
+    current_by_id = {m['id']: m for m in current}
+    changes = []
+    missing = []
+
+    for m in edited:
+        if m['id'] not in current_by_id:
+            missing.append(m)
+            continue
+
+        old = current_by_id[m['id']]
+        # Empty values (e.g. attachments, which Zendesk doesn't return) count as equal to absent ones.
+        changed = {k: m[k] for k in m if k in MACRO_ENTRIES and m[k] != old.get(k) and (m[k] or old.get(k))}
 
-        while res['next_page']:
-            res = get(config, res['next_page'])
-            all_locales.append(res['locales'])
-            bar.update(len(res['locales']))
+        if changed:
+            changes.append({'id': m['id'], **changed})
 
-    return all_locales
+    return changes, missing
 
 
-def get_all_hc_by_type(config, guide_type):
+def get_all_locales(config):
+    url = f"https://{config['subdomain']}.zendesk.com/api/v2/locales.json"
+
+    return get_all_pages(config, url, 'locales', label='Getting locales...', cursor=False)
+
+
+def get_all_hc_by_type(config, guide_type, concurrency=1, subdomain=None):
     """
     Get all help center content by type (articles, sections, categories).
     :param config:
     :param guide_type:
+    :param concurrency: max pages fetched at once
+    :param subdomain: the brand subdomain of the help center, defaults to the account's
     :return:
     """
     if guide_type not in VALID_HC_TYPES:
         raise ValueError(f"Type must be one of {VALID_HC_TYPES}")
 
-    click.echo(f"Getting {guide_type} with translations...")
+    subdomain = subdomain or config['subdomain']
+    click.echo(f"Getting {guide_type} with translations from {subdomain}...")
 
-    all_data = []
+    url = f"https://{subdomain}.zendesk.com/api/v2/help_center/{guide_type}.json"
 
-    url = f"https://{config['subdomain']}.zendesk.com/api/v2/help_center/{guide_type}.json?include=translations"
-    res = get(config, url)
+    return get_all_pages(config, url, guide_type, params={'include': 'translations'}, concurrency=concurrency)
 
-    all_data = all_data + res[guide_type]
 
-    with click.progressbar(length=res['count']) as bar:
-        bar.update(len(res[guide_type]))
+def get_hc_translations(config, guide_type, item_id, subdomain=None):
+    """
+    Get all translations of one help center item.
+    :param config: context config
+    :param guide_type: the item type (articles, sections, categories)
+    :param item_id: the item id
+    :param subdomain: the brand subdomain of the help center, defaults to the account's
+    :return list: the translations
+    """
+    subdomain = subdomain or config['subdomain']
+    url = f"https://{subdomain}.zendesk.com/api/v2/help_center/{guide_type}/{item_id}/translations.json"
 
-        while res['next_page']:  # Get all pages
-            res = get(config, res['next_page'])
-            all_data = all_data + res[guide_type]
-            bar.update(len(res[guide_type]))
+    return [t for res in iter_cursor_pages(config, url) for t in res['translations']]
 
-    return all_data
+
+def get_hc_changes_since(config, guide_type, start_time, concurrency=1, subdomain=None):
+    """
+    Get the help center items of a type changed since the given time, with
+    translations. Articles come from the incremental export API; sections
+    and categories have no incremental endpoint, so they are listed newest
+    first and the listing stops at the first unchanged item.
+    :param config: context config
+    :param guide_type: the item type (articles, sections, categories)
+    :param start_time: unix timestamp to get changes since
+    :param concurrency: max requests sent at once
+    :param subdomain: the brand subdomain of the help center, defaults to the account's
+    :return: generator of changed items
+    """
+    if guide_type not in VALID_HC_TYPES:
+        raise ValueError(f"Type must be one of {VALID_HC_TYPES}")
+
+    subdomain = subdomain or config['subdomain']
+    click.echo(f"Getting {guide_type} changed since {start_time} from {subdomain}...")
+
+    if guide_type != 'articles':
+        url = f"https://{subdomain}.zendesk.com/api/v2/help_center/{guide_type}.json"
+        params = {'include': 'translations', 'sort_by': 'updated_at', 'sort_order': 'desc'}
+
+        for item in get_all_pages(config, url, guide_type, params=params):
+            if parse_timestamp(item['updated_at']) < start_time:
+                return
+
+            yield item
+
+        return
+
+    url = f"https://{subdomain}.zendesk.com/api/v2/help_center/incremental/articles.json"
+    res = get(config, url, params={'start_time': start_time})
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            # The incremental export does not sideload translations, so fetch them per changed article.
+            translations = executor.map(lambda a: get_hc_translations(config, 'articles', a['id'], subdomain),
+                                        res['articles'])
+
+            for article, article_translations in zip(res['articles'], translations):
+                yield {**article, 'translations': article_translations}
+
+            if not res['articles'] or not res.get('next_page') or res['next_page'] == url:
+                return
+
+            url = res['next_page']
+            res = get(config, url)
+
+
+def parse_timestamp(value):
+    """
+    Convert a Zendesk ISO 8601 timestamp to a unix timestamp.
+    :param value: the timestamp, e.g. 2021-06-01T12:00:00Z
+    :return int: seconds since the epoch
+    """
+    return int(datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc).timestamp())
 
 
 def get_all_brands(config):
     url = f"https://{config['subdomain']}.zendesk.com/api/v2/brands.json"
-    res = get(config, url)
 
-    return res['brands']
+    return get_all_pages(config, url, 'brands', label='Getting brands...')
 
 
 def confirm_or_create_path(path):
@@ -555,6 +897,148 @@ def confirm_or_create_path(path):
                 raise
 
 
+def get_output_directory(ctx, directory):
+    """
+    Get the directory a command should write to. When the command runs for
+    several profiles at once, each profile writes to its own subdirectory.
+    :param ctx: the command context
+    :param directory: the directory given to the command
+    :return: the output directory
+    """
+    if ctx.obj.get('output_subdirectory'):
+        directory = os.path.join(directory, ctx.obj['output_subdirectory'])
+        confirm_or_create_path(directory)
+
+    return directory
+
+
+def write_json_stream(f, records, key=None, indent=2):
+    """
+    Write records as a JSON array one record at a time, optionally wrapped
+    in an object under `key`. The output is the same as `json.dump` of the
+    whole list, but only one record is held in memory.
+    :param f: the file to write to
+    :param records: iterable of records
+    :param key: wrap the array in an object with this key
+    :param indent: indent level
+    """
+    depth = 2 if key else 1
+
+    if key:
+        f.write('{\n' + ' ' * indent + json.dumps(key) + ': ')
+
+    f.write('[')
+    empty = True
+
+    for record in records:
+        f.write('\n' if empty else ',\n')
+        f.write(textwrap.indent(json.dumps(record, indent=indent), ' ' * indent * depth))
+        empty = False
+
+    if not empty:
+        f.write('\n' + ' ' * indent * (depth - 1))
+
+    f.write(']')
+
+    if key:
+        f.write('\n}')
+
+
+def order_columns(fieldnames, first_columns=('id', 'title')):
+    """
+    Order flattened columns: `first_columns` first, the flattened
+    'action:'/'condition:' columns last.
+    :param fieldnames: the column names
+    :param first_columns: columns to move to the front
+    :return list: the ordered column names
+    """
+    fieldnames = sorted(fieldnames, reverse=True)  # put all the 'action:' columns at the end
+    first_columns = [column for column in first_columns if column in fieldnames]
+
+    for index, column in enumerate(first_columns):
+        fieldnames.insert(index, fieldnames.pop(fieldnames.index(column)))
+
+    return fieldnames
+
+
+@contextmanager
+def spill_rows(rows, track_types=False):
+    """
+    Spill rows whose keys differ from row to row to a temporary file,
+    collecting their columns in the same pass. Each row is stored as a
+    JSON list of values by column position, so only one row is held in
+    memory and column names are not repeated on every line.
+    :param rows: iterable of dict rows
+    :param track_types: flag to also collect the type names of the values in each column
+    :return: context manager giving the column positions, the value types per column, and a function that reads
+             the rows back as tuples in a given column order
+    """
+    positions = {}
+    types = {}
+
+    with tempfile.TemporaryFile('w+') as spill:
+        for row in rows:
+            values = [None] * len(positions)
+
+            for column, value in row.items():
+                position = positions.get(column)
+
+                if position is None:
+                    positions[column] = len(values)
+                    values.append(value)
+                else:
+                    values[position] = value
+
+                if track_types and value is not None:
+                    types.setdefault(column, set()).add(type(value).__name__)
+
+            spill.write(json.dumps(values) + '\n')
+
+        def read_rows(columns):
+            width = len(positions)
+            indexes = [positions[column] for column in columns]
+            get_values = operator.itemgetter(*indexes) if len(indexes) > 1 else lambda values: (values[indexes[0]],)
+
+            spill.seek(0)
+
+            for line in spill:
+                values = json.loads(line)
+                values.extend([None] * (width - len(values)))  # columns first seen after this row
+                yield get_values(values)
+
+        yield positions, types, read_rows
+
+
+def write_ndjson_stream(f, records):
+    """
+    Write records as newline-delimited JSON, one compact record per line.
+    :param f: the file to write to
+    :param records: iterable of records
+    """
+    for record in records:
+        f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+
+def write_csv_stream(f, rows, first_columns=('id', 'title')):
+    """
+    Write rows whose keys differ from row to row as CSV. The header needs
+    every key, so rows are spilled to a temporary file while the keys are
+    collected and then written out, holding only one row in memory.
+    :param f: the file to write to
+    :param rows: iterable of dict rows
+    :param first_columns: columns to move to the front
+    """
+    with spill_rows(rows) as (positions, _, read_rows):
+        if not positions:
+            return
+
+        columns = order_columns(positions, first_columns)
+
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(read_rows(columns))
+
+
 def write_json(output_path, filename, data):
     destination = os.path.join(output_path, filename)
 
@@ -563,7 +1047,10 @@ def write_json(output_path, filename, data):
     confirm_or_create_path(output_path)
 
     with click.open_file(destination, 'w') as f:
-        json.dump(data, f, indent=4)
+        if isinstance(data, dict):
+            json.dump(data, f, indent=4)
+        else:
+            write_json_stream(f, data, indent=4)
 
 
 def write_csv(output_path, filename, data):
@@ -574,28 +1061,83 @@ def write_csv(output_path, filename, data):
     confirm_or_create_path(output_path)
 
     with click.open_file(destination, 'w') as f:
-        fieldnames = data[0].keys()
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
+        write_csv_rows(f, data)
 
-        for d in data:
-            writer.writerow(d)
 
+def write_csv_rows(f, data):
+    """
+    Write rows to a CSV file, taking the columns from the first row.
+    :param f: file open for writing
+    :param data: iterable of dicts
+    """
+    data = iter(data)
+    first = next(data, None)
 
-def archive_directory(path):
-    click.echo(f"Archiving directory: {click.format_filename(path, shorten=True)}")
-    archive_name = shutil.make_archive(path, 'zip', path)  # Zip up the directory at path
-    shutil.rmtree(path)  # Delete unzipped directory
+    if first is None:
+        return
 
-    return archive_name
+    writer = csv.DictWriter(f, fieldnames=first.keys())
+    writer.writeheader()
+    writer.writerow(first)
+
+    for d in data:
+        writer.writerow(d)
+
+
+def read_backup_state(directory):
+    """
+    Read the incremental backup state kept in a backup directory.
+    :param directory: the backup directory
+    :return dict: state per help center, e.g. {'mysubdomain': {'start_time': 1600000000, 'archive': 'backup_1600000000.zip'}}
+    """
+    path = os.path.join(directory, BACKUP_STATE_FILENAME)
+
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_backup_state(directory, state):
+    with open(os.path.join(directory, BACKUP_STATE_FILENAME), 'w') as f:
+        json.dump(state, f, indent=4)
+
+
+def read_archived_json(archive_path, filename):
+    """
+    Read a JSON file from a backup archive.
+    :param archive_path: path to the zip archive
+    :param filename: the file inside the archive
+    :return: the parsed JSON
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        with archive.open(filename) as f:
+            return json.load(f)
 
 
 def push_archive_to_remote(repo_dir, remote_name, archive_path, backup_time):
+    push_paths_to_remote(repo_dir=repo_dir, remote_name=remote_name, paths=[archive_path], backup_time=backup_time)
+
+
+def push_paths_to_remote(repo_dir, remote_name, paths, backup_time):
+    # Profiles backed up at once may share a repository, which git can only update one commit at a time.
+    with _git_lock:
+        _push_paths_to_remote(repo_dir, remote_name, paths, backup_time)
+
+
+def _push_paths_to_remote(repo_dir, remote_name, paths, backup_time):
+    import git
+
     click.echo(f"Finding repository at {click.format_filename(repo_dir)}")
     repo = git.Repo(repo_dir)
 
-    click.echo(f"Staging {archive_path}")
-    repo.index.add([archive_path])
+    if len(paths) == 1:
+        click.echo(f"Staging {paths[0]}")
+    else:
+        click.echo(f"Staging {len(paths)} files")
+
+    repo.index.add(paths)
 
     commit_msg = f"Add backup @ {backup_time}"
     click.echo(f"Committing with message: {commit_msg}")
@@ -603,5 +1145,4 @@ def push_archive_to_remote(repo_dir, remote_name, archive_path, backup_time):
 
     click.echo(f"Pushing to remote {remote_name}")
     origin = repo.remote(remote_name)
-    origin.push()
-
+    origin.push()
\ No newline at end of file
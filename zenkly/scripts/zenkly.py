@@ -3,25 +3,52 @@ import configparser
 import click
 import logging
 from .constants import APP_NAME
+from .client import close_clients, set_client_options
+from .checkpoint import set_checkpoint_options
+from .metrics import enable_metrics
+from .fan_out import ProfileGroup
 
-from .commands.configure import configure
-from .commands.get_macros import get_macros
-from .commands.get_triggers import get_triggers
-from .commands.get_automations import get_automations
-from .commands.get_views import get_views
-from .commands.update_macros import update_macros
-from .commands.add_macros import add_macros
-from .commands.backup_guide import backup_guide
-from .commands.create_article_mapping import create_article_mapping
-from .commands.upload_theme import upload_theme
-from .commands.show_brands import show_brands
+COMMANDS = {
+    'configure': 'configure',
+    'get-macros': 'get_macros',
+    'get-triggers': 'get_triggers',
+    'get-automations': 'get_automations',
+    'get-views': 'get_views',
+    'update-macros': 'update_macros',
+    'add-macros': 'add_macros',
+    'backup-guide': 'backup_guide',
+    'restore-guide': 'restore_guide',
+    'create-article-mapping': 'create_article_mapping',
+    'upload-theme': 'upload_theme',
+    'show-brands': 'show_brands',
+    'rule-references': 'rule_references',
+    'cache': 'cache',
+    'index': 'index',
+    'search': 'search',
+}
 
 
-@click.group()
+@click.group(cls=ProfileGroup,
+             lazy_subcommands={name: f"zenkly.scripts.commands.{module}:{module}" for name, module in COMMANDS.items()})
 @click.option('--profile', type=click.STRING, default='default')
+@click.option('--profiles', type=click.STRING, help='Comma-separated profiles to run the command for at once.')
+@click.option('--all-profiles', is_flag=True, help='Run the command for every configured profile at once.')
 @click.option('--debug', is_flag=True)
+@click.option('--concurrency', type=click.IntRange(min=1), default=1,
+              help='Max pages or items requested at once.')
+@click.option('--cache', is_flag=True, help='Reuse cached GET responses, revalidating them once stale.')
+@click.option('--engine', type=click.Choice(['sync', 'async'], case_sensitive=False), default='sync',
+              help='Send concurrent requests from a thread pool (sync) or an asyncio client (async).')
+@click.option('--checkpoint', is_flag=True,
+              help='Journal every page fetched, so an interrupted export or backup can be resumed.')
+@click.option('--resume', is_flag=True,
+              help='Continue an interrupted export, backup or macro upload from where it stopped.')
+@click.option('--stats', is_flag=True, help='Print request latencies, waits and list throughput at the end.')
+@click.option('--trace-file', type=click.Path(dir_okay=False, writable=True),
+              help='Write a Chrome trace of every request, wait and list to this file.')
 @click.pass_context
-def cli(ctx, profile, debug):
+def cli(ctx, profile, profiles, all_profiles, debug, concurrency, cache, engine, checkpoint, resume, stats,
+        trace_file):
     if debug:
         try:
             from http.client import HTTPConnection
@@ -38,6 +65,7 @@ def cli(ctx, profile, debug):
         ctx.obj = {}
 
     ctx.obj['profile'] = profile
+    ctx.obj['concurrency'] = concurrency
     ctx.obj['configuration'] = {}
 
     conf_path = os.path.join(click.get_app_dir(APP_NAME), 'config.ini')
@@ -48,15 +76,35 @@ def cli(ctx, profile, debug):
         for key in config[profile]:
             ctx.obj['configuration'][key] = config[profile][key]
 
+    if all_profiles:
+        profiles = config.sections()
+
+        if not profiles:
+            raise click.UsageError('No profiles configured. Try `zenkly configure`', ctx=ctx)
+    elif profiles is not None:
+        profiles = [p.strip() for p in profiles.split(',') if p.strip()]
+
+        if not profiles:
+            raise click.UsageError('No profiles selected. Give --profiles a comma-separated list of profiles.',
+                                   ctx=ctx)
+
+    if profiles:
+        missing = [p for p in profiles if p not in config]
+
+        if missing:
+            raise click.UsageError(f"No configuration found for profile(s): {', '.join(missing)}", ctx=ctx)
+
+        ctx.obj['profiles'] = {p: dict(config[p]) for p in profiles}
+
+    set_client_options(cache=cache, engine=engine.lower())
+    set_checkpoint_options(checkpoint=checkpoint, resume=resume)
+    ctx.call_on_close(close_clients)
+
+    if stats or trace_file:
+        metrics = enable_metrics(trace_file)
+
+        if stats:
+            ctx.call_on_close(lambda: click.echo('\n' + metrics.summary(), err=True))
+
+        ctx.call_on_close(metrics.close)
 
-cli.add_command(configure)
-cli.add_command(get_macros)
-cli.add_command(get_triggers)
-cli.add_command(get_automations)
-cli.add_command(get_views)
-cli.add_command(update_macros)
-cli.add_command(add_macros)
-cli.add_command(backup_guide)
-cli.add_command(create_article_mapping)
-cli.add_command(upload_theme)
-cli.add_command(show_brands)